@@ -0,0 +1,37 @@
+import os, sys, tempfile
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SERVER_DIR = os.path.join(REPO_DIR, "socketServer")
+CLIENT_DIR = os.path.join(REPO_DIR, "qtApp")
+
+
+def use_server_dir():
+    """Make the server modules importable and run from the server directory like zelnaServer.py does."""
+    if SERVER_DIR not in sys.path:
+        sys.path.insert(0, SERVER_DIR)
+    os.chdir(SERVER_DIR)
+
+
+def use_scratch_dir():
+    """Make the server modules importable but run in a fresh directory, so temp/ files of the real
+    server (history, audio cache) are never touched by fakes."""
+    if SERVER_DIR not in sys.path:
+        sys.path.insert(0, SERVER_DIR)
+    scratch = tempfile.mkdtemp(prefix="zelna-bench-")
+    os.chdir(scratch)
+    return scratch
+
+
+def use_client_dir():
+    """Make the client modules importable."""
+    if CLIENT_DIR not in sys.path:
+        sys.path.insert(0, CLIENT_DIR)
+
+
+def percentile(values, p):
+    """Return the p-th percentile (0-100) of a list of numbers."""
+    values = sorted(values)
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, max(0, round(p / 100 * (len(values) - 1))))
+    return values[index]
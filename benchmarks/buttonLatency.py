@@ -0,0 +1,114 @@
+"""Button latency, missed and extra presses, and idle wakeups: edge-triggered input vs the old 50 ms polling.
+
+Runs anywhere, the buttons are driven by the FakeGPIO simulator with bouncing contacts.
+Run from the repository root:
+    python -m benchmarks.buttonLatency [--presses 50] [--idle 5]
+"""
+import argparse, random, resource, threading, time
+from benchmarks import use_client_dir, percentile
+
+PIN = 26
+
+
+class PollingInput:
+    """What GPIOThread did before: read the pin every 50 ms and report changes."""
+
+    def __init__(self, gpio, onPress, onRelease, interval=0.05):
+        self.gpio = gpio
+        self.onPress = onPress
+        self.onRelease = onRelease
+        self.interval = interval
+        self.running = True
+
+    def start(self):
+        self.gpio.setup(PIN, self.gpio.IN, pull_up_down=self.gpio.PUD_UP)
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def run(self):
+        pressed = False
+        while self.running:
+            if not self.gpio.input(PIN):
+                if not pressed:
+                    self.onPress()
+                    pressed = True
+            else:
+                if pressed:
+                    self.onRelease()
+                pressed = False
+            time.sleep(self.interval)
+
+    def stop(self):
+        self.running = False
+
+
+def idle_wakeups(seconds):
+    """Voluntary context switches per second of the whole process while nothing happens."""
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_nvcsw
+    time.sleep(seconds)
+    return (resource.getrusage(resource.RUSAGE_SELF).ru_nvcsw - before) / seconds
+
+
+def run(make_input, presses, idle):
+    from FakeGPIO import FakeGPIO
+
+    gpio = FakeGPIO(verbose=False)
+    pressedAt = [None]
+    latencies = []
+    counts = {"press": 0, "release": 0}
+
+    def onPress():
+        counts["press"] += 1
+        if pressedAt[0] is not None:
+            latencies.append(time.perf_counter() - pressedAt[0])
+            pressedAt[0] = None
+
+    def onRelease():
+        counts["release"] += 1
+
+    buttons = make_input(gpio, onPress, onRelease)
+    buttons.start()
+    wakeups = idle_wakeups(idle)
+
+    rng = random.Random(1)
+    for _ in range(presses):
+        time.sleep(rng.uniform(0.05, 0.15))
+        pressedAt[0] = time.perf_counter()
+        gpio.bounce(PIN, gpio.LOW)
+        time.sleep(rng.uniform(0.06, 0.2))  # a quick tap
+        gpio.bounce(PIN, gpio.HIGH)
+    time.sleep(0.2)
+    buttons.stop()
+    return latencies, counts, wakeups
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--presses", type=int, default=50)
+    parser.add_argument("--idle", type=float, default=5.0, help="seconds to count wakeups with no button activity")
+    args = parser.parse_args()
+
+    use_client_dir()
+    from buttonInput import ButtonInput
+
+    def edge(gpio, onPress, onRelease):
+        buttons = ButtonInput(gpio)
+        buttons.add(PIN, onPress, onRelease)
+        return buttons
+
+    rows = [
+        ("polling 50 ms", *run(PollingInput, args.presses, args.idle)),
+        ("edge-triggered", *run(edge, args.presses, args.idle)),
+    ]
+
+    print(f"{args.presses} bouncing presses")
+    print(f"{'':<16}{'p50 ms':>8}{'p95 ms':>8}{'max ms':>8}{'presses':>9}{'releases':>10}{'idle wakeups/s':>16}")
+    for label, latencies, counts, wakeups in rows:
+        ms = [l * 1000 for l in latencies]
+        print(
+            f"{label:<16}{percentile(ms, 50):>8.1f}{percentile(ms, 95):>8.1f}{max(ms, default=0):>8.1f}"
+            f"{counts['press']:>9}{counts['release']:>10}{wakeups:>16.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+"""Stand-in for the Ollama HTTP API with a configurable token rate and first-token latency.
+
+With cacheSlots it also models Ollama's prompt cache: each slot holds the last prompt and reply it
+processed, a request reuses the slot sharing the longest prefix if that covers half its prompt (else
+the least recently used one)
+and only the rest of the prompt counts as prompt_eval_count, prefilled at prefillRate tokens/s.
+
+Implements just what the server uses: /api/chat (streamed or not), /api/generate, /api/tags and /api/ps.
+Run on its own with:  python -m benchmarks.fakeOllama --port 11434
+"""
+import argparse, json, os, threading, time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+REPLY_TEXT = (
+    "Sure! Here is what I found for you. The answer depends a little on the details, "
+    "but in most cases the simplest option works best. Let me know if you want more ideas, "
+    "I am always happy to help with anything else you need today. "
+)
+
+
+class FakeOllama:
+    """Fake Ollama server on a background thread."""
+
+    def __init__(
+        self, host="127.0.0.1", port=0, tokenRate=30.0, firstTokenLatency=0.2, replyTokens=60, loadSeconds=0.0,
+        cacheSlots=0, prefillRate=500.0,
+    ):
+        self.tokenRate = tokenRate
+        self.firstTokenLatency = firstTokenLatency
+        self.replyTokens = replyTokens
+        self.loadSeconds = loadSeconds  # reported as load_duration of the first request
+        self.loaded = False
+        self.cacheSlots = [{"text": ""} for _ in range(cacheSlots)]  # prompt and reply per slot, most recently used last
+        self.prefillRate = prefillRate
+        self.requests = 0
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def tokens(self):
+        words = REPLY_TEXT.split(" ")
+        return [words[i % len(words)] + " " for i in range(self.replyTokens)]
+
+    def prefill(self, prompt):
+        """Tokens of prompt that are not cached, and the slot the request runs in."""
+        with self.lock:
+            if not self.cacheSlots:
+                return len(prompt) // 4, None
+            shared = [len(os.path.commonprefix([slot["text"], prompt])) for slot in self.cacheSlots]
+            best = max(range(len(shared)), key=lambda i: (shared[i], i))
+            index = best if shared[best] >= len(prompt) / 2 else 0  # barely similar prompts take the oldest slot
+            slot = self.cacheSlots.pop(index)
+            self.cacheSlots.append(slot)  # the first slot is the least recently used
+            return (len(prompt) - shared[index]) // 4, slot
+
+    def remember(self, slot, prompt, reply):
+        if slot is not None:
+            with self.lock:
+                slot["text"] = prompt + prompt_text([{"role": "assistant", "content": reply}])
+
+    def load_duration(self):
+        with self.lock:
+            self.requests += 1
+            cold = not self.loaded
+            self.loaded = True
+        if cold and self.loadSeconds:
+            time.sleep(self.loadSeconds)
+        return int((self.loadSeconds if cold else 0) * 1e9)
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _json(self, body, status=200):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                if self.path in ("/api/tags", "/api/ps"):
+                    self._json({"models": [{"name": "llama3.2:latest", "model": "llama3.2:latest", "size": 0}]})
+                elif self.path in ("/", "/api/version"):
+                    self._json({"version": "0.0.0-fake"})
+                else:
+                    self._json({"error": "not found"}, 404)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or b"{}")
+                if self.path == "/api/chat":
+                    self._chat(body)
+                elif self.path == "/api/generate":
+                    loadDuration = fake.load_duration()
+                    self._json({"model": body.get("model"), "created_at": now(), "response": "", "done": True, "load_duration": loadDuration})
+                else:
+                    self._json({"error": "not found"}, 404)
+
+            def _chat(self, body):
+                loadDuration = fake.load_duration()
+                prompt = prompt_text(body.get("messages", []))
+                promptTokens, slot = fake.prefill(prompt)
+                prefillSeconds = promptTokens / fake.prefillRate if slot is not None else fake.firstTokenLatency
+                started = time.perf_counter()
+                time.sleep(prefillSeconds)
+                tokens = fake.tokens()
+                fake.remember(slot, prompt, "".join(tokens))
+
+                final = {
+                    "model": body.get("model"),
+                    "created_at": now(),
+                    "done": True,
+                    "done_reason": "stop",
+                    "load_duration": loadDuration,
+                    "prompt_eval_count": promptTokens,
+                    "prompt_eval_duration": int(prefillSeconds * 1e9),
+                    "eval_count": len(tokens),
+                }
+
+                if not body.get("stream", True):
+                    time.sleep(len(tokens) / fake.tokenRate)
+                    final["message"] = {"role": "assistant", "content": "".join(tokens)}
+                    final["total_duration"] = int((time.perf_counter() - started) * 1e9)
+                    self._json(final)
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                try:
+                    for token in tokens:
+                        self._chunk({"model": body.get("model"), "created_at": now(), "message": {"role": "assistant", "content": token}, "done": False})
+                        time.sleep(1 / fake.tokenRate)
+                    final["created_at"] = now()
+                    final["message"] = {"role": "assistant", "content": ""}
+                    final["total_duration"] = int((time.perf_counter() - started) * 1e9)
+                    self._chunk(final)
+                    self.wfile.write(b"0\r\n\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # the client cancelled the request
+
+            def _chunk(self, body):
+                data = (json.dumps(body) + "\n").encode("utf-8")
+                self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+                self.wfile.flush()
+
+        return Handler
+
+
+def prompt_text(messages):
+    return "".join(f"<{m.get('role')}>{m.get('content', '')}" for m in messages)
+
+
+def now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--token-rate", type=float, default=30.0, help="tokens per second per request")
+    parser.add_argument("--first-token-latency", type=float, default=0.2, help="seconds before the first token")
+    parser.add_argument("--reply-tokens", type=int, default=60)
+    parser.add_argument("--cache-slots", type=int, default=0, help="model a prompt cache with this many slots")
+    parser.add_argument("--prefill-rate", type=float, default=500.0, help="prompt tokens per second with --cache-slots")
+    args = parser.parse_args()
+
+    fake = FakeOllama(
+        port=args.port, tokenRate=args.token_rate, firstTokenLatency=args.first_token_latency, replyTokens=args.reply_tokens,
+        cacheSlots=args.cache_slots, prefillRate=args.prefill_rate,
+    )
+    fake.start()
+    print(f"Fake Ollama listening on {fake.url}")
+    try:
+        fake.thread.join()
+    except KeyboardInterrupt:
+        fake.stop()
+
+
+if __name__ == "__main__":
+    main()
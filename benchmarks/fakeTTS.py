@@ -0,0 +1,34 @@
+"""Stand-in for the TTS process pool that returns silent pcm after a configurable synthesis time."""
+import threading, time
+
+
+class FakeTTSPool:
+    """Same interface as ttsWorkers.TTSWorkerPool, without pyttsx3.
+
+    Synthesis takes secondsPerChar per character of text and at most `size` texts are synthesized at
+    the same time, like a pool of `size` processes.
+    """
+
+    def __init__(self, size=2, secondsPerChar=0.002, samplerate=22050, audioSecondsPerChar=0.06):
+        self.size = size
+        self.secondsPerChar = secondsPerChar
+        self.samplerate = samplerate
+        self.audioSecondsPerChar = audioSecondsPerChar
+        self.slots = threading.Semaphore(size)
+        self.restarts = 0
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def synthesize(self, text, audioFormat="pcm", timings=None):
+        with self.slots:
+            started = time.perf_counter()
+            time.sleep(len(text) * self.secondsPerChar)
+            frames = int(len(text) * self.audioSecondsPerChar * self.samplerate)
+            audio = bytes(frames * 2)
+            if timings is not None:
+                timings["tts_synthesize"] = timings.get("tts_synthesize", 0) + time.perf_counter() - started
+        return audio, {"format": "pcm", "samplerate": self.samplerate, "channels": 1}
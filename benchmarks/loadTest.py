@@ -0,0 +1,226 @@
+"""End-to-end load test of the Socket.IO server against a fake Ollama and a fake TTS pool.
+
+N clients connect as separate devices and replay scripted conversations; the report shows p50/p99
+end-to-end latency, time to first text and audio, and messages per second. Run from the repository root:
+    python -m benchmarks.loadTest [--clients 8] [--messages 5] [--token-rate 30] [--script convs.json]
+                                  [--server async] [--idle 200]
+
+A script file is a JSON list of conversations, each a list of user messages.
+"""
+import argparse, asyncio, json, os, threading, time, uuid
+from benchmarks import percentile, use_scratch_dir
+from benchmarks.fakeOllama import FakeOllama
+from benchmarks.fakeTTS import FakeTTSPool
+
+CONVERSATIONS = [
+    ["Hi there, how are you today?", "What is a good name for a cat?", "And one for a dog?", "Thanks, that is all."],
+    ["What could I cook tonight with rice and eggs?", "How long do I boil the eggs?", "Any idea for a dessert?"],
+    ["Tell me a fun fact about space.", "Tell me another one.", "Which planet is the biggest?"],
+]
+
+
+class Client:
+    """One simulated device, sends a message and waits for its final audio marker."""
+
+    def __init__(self, index, url, conversation, messages, timeout):
+        import socketio
+
+        self.index = index
+        self.url = url
+        self.conversation = conversation
+        self.messages = messages
+        self.timeout = timeout
+        self.sio = socketio.Client(reconnection=False)
+        self.results = []  # per message: dict of seconds since sending, or {"busy": True}
+        self.errors = 0
+        self.current = None
+        self.done = threading.Event()
+        self.sio.on("response_chunk", self.onText)
+        self.sio.on("response", self.onText)
+        self.sio.on("audio_chunk", self.onAudio)
+        self.sio.on("response_audio", self.onAudio)
+        self.sio.on("busy", self.onBusy)
+
+    def _mark(self, data, key):
+        current = self.current
+        if current is None or not isinstance(data, dict) or data.get("requestId") != current["requestId"]:
+            return None
+        current.setdefault(key, time.perf_counter() - current["sent"])
+        return current
+
+    def onText(self, data):
+        self._mark(data, "firstText")
+
+    def onAudio(self, data):
+        current = self._mark(data, "firstAudio")
+        if current is not None and data.get("final"):
+            current["total"] = time.perf_counter() - current["sent"]
+            self.done.set()
+
+    def onBusy(self, data):
+        current = self._mark(data, "busy")
+        if current is not None:
+            self.done.set()
+
+    def run(self, startBarrier):
+        self.sio.connect(self.url, auth={"token": "zelnaAuthentication", "device": f"loadtest-{self.index}"}, transports=["websocket"])
+        startBarrier.wait()
+        try:
+            for i in range(self.messages):
+                text = self.conversation[i % len(self.conversation)]
+                self.done.clear()
+                self.current = {"requestId": str(uuid.uuid4()), "sent": time.perf_counter()}
+                self.sio.emit("message", {"text": text, "requestId": self.current["requestId"]})
+                if not self.done.wait(self.timeout):
+                    self.errors += 1
+                    continue
+                self.results.append(self.current)
+        finally:
+            self.sio.disconnect()
+
+
+def load_script(path):
+    if not path:
+        return CONVERSATIONS
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def wait_for_server(url, timeout=10):
+    import urllib.request
+
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            urllib.request.urlopen(url + "/metrics", timeout=1).read()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.1)
+
+
+def use_scheduler(zelnaServer, args):
+    """Replace the scheduler both servers use by one with the worker counts of the command line."""
+    zelnaServer.scheduler = zelnaServer.Scheduler(
+        llmWorkers=args.llm_workers or zelnaServer.LLM_WORKERS,
+        ttsWorkers=args.tts_workers or zelnaServer.TTS_WORKERS,
+        maxQueued=args.max_queued or zelnaServer.MAX_QUEUED_REQUESTS,
+    )
+
+
+def start_threaded_server(zelnaServer, args):
+    use_scheduler(zelnaServer, args)
+    app = zelnaServer.create_app(warmup=False)
+    threading.Thread(
+        target=zelnaServer.socketio.run,
+        args=(app,),
+        kwargs={"host": "127.0.0.1", "port": args.port, "use_reloader": False, "log_output": False, "allow_unsafe_werkzeug": True},
+        daemon=True,
+    ).start()
+
+
+def start_async_server(zelnaServer, args):
+    import zelnaAsyncServer
+    from aiohttp import web
+
+    use_scheduler(zelnaServer, args)
+
+    async def serve():
+        app = zelnaAsyncServer.create_app(
+            warmup=False,
+            llmWorkers=args.llm_workers or zelnaServer.LLM_WORKERS,
+            maxQueued=args.max_queued or zelnaServer.MAX_QUEUED_REQUESTS,
+        )
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, "127.0.0.1", args.port).start()
+        await asyncio.Event().wait()
+
+    threading.Thread(target=asyncio.run, args=(serve(),), daemon=True).start()
+
+
+def connect_idle_clients(url, count):
+    """Connections that only stay connected, to see what idle handhelds cost the server."""
+    import socketio
+
+    idle = []
+    for i in range(count):
+        client = socketio.Client(reconnection=False)
+        client.connect(url, auth={"token": "zelnaAuthentication", "device": f"loadtest-idle-{i}"}, transports=["websocket"])
+        idle.append(client)
+    return idle
+
+
+def report(clients, elapsed, zelnaServer):
+    results = [r for c in clients for r in c.results]
+    answered = [r for r in results if "total" in r]
+    busy = sum(1 for r in results if "busy" in r)
+    errors = sum(c.errors for c in clients)
+
+    print(f"\n{len(answered)} answered, {busy} busy, {errors} timed out in {elapsed:.1f} s "
+          f"-> {len(answered) / elapsed:.2f} messages/sec")
+    print(f"{'':<18}{'p50 ms':>10}{'p99 ms':>10}")
+    for label, key in (("first text", "firstText"), ("first audio", "firstAudio"), ("end to end", "total")):
+        values = [r[key] * 1000 for r in answered if key in r]
+        if values:
+            print(f"{label:<18}{percentile(values, 50):>10.0f}{percentile(values, 99):>10.0f}")
+
+    print("\nserver stages")
+    for stage, quantiles in sorted(zelnaServer.metrics.stage_quantiles().items()):
+        print(f"{stage:<18}{quantiles[0.5] * 1000:>10.0f}{quantiles[0.99] * 1000:>10.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--messages", type=int, default=5, help="messages sent by every client")
+    parser.add_argument("--script", help="JSON file with conversations to replay")
+    parser.add_argument("--token-rate", type=float, default=30.0, help="fake LLM tokens per second per request")
+    parser.add_argument("--first-token-latency", type=float, default=0.2, help="fake LLM seconds to the first token")
+    parser.add_argument("--reply-tokens", type=int, default=60)
+    parser.add_argument("--tts-seconds-per-char", type=float, default=0.002)
+    parser.add_argument("--llm-workers", type=int)
+    parser.add_argument("--tts-workers", type=int)
+    parser.add_argument("--max-queued", type=int)
+    parser.add_argument("--timeout", type=float, default=60.0, help="seconds to wait for one reply")
+    parser.add_argument("--port", type=int, default=5055)
+    parser.add_argument("--server", choices=["threaded", "async"], default="threaded", help="zelnaServer.py or zelnaAsyncServer.py")
+    parser.add_argument("--idle", type=int, default=0, help="extra connections that send nothing")
+    args = parser.parse_args()
+
+    fakeOllama = FakeOllama(tokenRate=args.token_rate, firstTokenLatency=args.first_token_latency, replyTokens=args.reply_tokens).start()
+    os.environ["OLLAMA_HOST"] = fakeOllama.url  # read by the ollama module when it is imported
+    scratch = use_scratch_dir()
+    import zelnaServer
+
+    zelnaServer.ttsPool = FakeTTSPool(size=args.tts_workers or zelnaServer.TTS_WORKERS, secondsPerChar=args.tts_seconds_per_char)
+    if args.server == "async":
+        start_async_server(zelnaServer, args)
+    else:
+        start_threaded_server(zelnaServer, args)
+    url = f"http://127.0.0.1:{args.port}"
+    wait_for_server(url)
+    print(f"{args.server} server on {url}, fake Ollama on {fakeOllama.url}, scratch dir {scratch}")
+    idle = connect_idle_clients(url, args.idle)
+
+    conversations = load_script(args.script)
+    clients = [Client(i, url, conversations[i % len(conversations)], args.messages, args.timeout) for i in range(args.clients)]
+    startBarrier = threading.Barrier(len(clients) + 1)
+    threads = [threading.Thread(target=c.run, args=(startBarrier,), daemon=True) for c in clients]
+    for thread in threads:
+        thread.start()
+    startBarrier.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    report(clients, elapsed, zelnaServer)
+    for client in idle:
+        client.disconnect()
+    fakeOllama.stop()
+
+
+if __name__ == "__main__":
+    main()
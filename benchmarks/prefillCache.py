@@ -0,0 +1,96 @@
+"""Prefill time per turn over a scripted conversation, with a sliding vs a stable prompt prefix.
+
+The running summary is on like in the server, its calls go to the same backend and can evict the
+conversation's prompt from the cache. Needs a running Ollama with the model pulled, or --fake to
+run against the fake Ollama with a modelled prompt cache (single slot by default). Run from the repository root:
+    python -m benchmarks.prefillCache [--turns 20] [--budget 768] [--model llama3.2:latest] [--no-summarize] [--fake [--cache-slots 1]]
+"""
+import argparse, time
+from benchmarks import use_server_dir
+
+QUESTIONS = [
+    "Hi! My name is Sam and I live in a small flat near the river.",
+    "What could I cook tonight with rice, eggs and spinach?",
+    "How long should I boil the eggs for that?",
+    "Can you suggest a quick dessert as well?",
+    "Tell me a fun fact about rivers.",
+    "What is a good houseplant for a dark flat?",
+    "How often should I water it?",
+    "Remind me what my name is?",
+    "Give me three ideas for a rainy weekend.",
+    "Which of those would be cheapest?",
+]
+
+
+def run(mode, args, client):
+    from contextWindow import ContextWindow
+    from zelnaServer import SYSTEM_PROMPT, SUMMARY_PROMPT, clean_text
+
+    summaries = []
+
+    def summarize(previousSummary, messages):
+        # same request as the server's summarize_messages
+        transcript = "\n".join(f"{m.get('role')}: {m.get('content')}" for m in messages)
+        prompt = [
+            {"role": "system", "content": SUMMARY_PROMPT},
+            {"role": "user", "content": f"Current summary: {previousSummary or '(none)'}\n\nConversation:\n{transcript}"},
+        ]
+        response = client.chat(model=args.model, messages=prompt, options={"temperature": 0.2, "num_predict": 200})
+        summaries.append(response.get("prompt_eval_count") or 0)
+        return clean_text(response["message"]["content"]).strip()
+
+    context = ContextWindow(args.budget, summarize if args.summarize else None, stablePrefix=(mode == "stable"))
+    messages = []
+    rows = []
+    for turn in range(args.turns):
+        messages.append({"id": len(messages) + 1, "role": "user", "content": QUESTIONS[turn % len(QUESTIONS)]})
+        prompt = context.build(SYSTEM_PROMPT, messages)
+
+        started = time.perf_counter()
+        response = client.chat(model=args.model, messages=prompt, options={"temperature": 0.8, "num_predict": 80})
+        elapsed = time.perf_counter() - started
+
+        raw = response["message"]["content"]
+        messages.append({"id": len(messages) + 1, "role": "assistant", "content": clean_text(raw), "raw": raw})
+        rows.append((turn + 1, response.get("prompt_eval_count") or 0, (response.get("prompt_eval_duration") or 0) / 1e6, elapsed))
+
+        while context.summaryRunning:  # the user is still listening to the reply
+            time.sleep(0.01)
+    return rows, summaries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--budget", type=int, default=768, help="context token budget, small enough to overflow")
+    parser.add_argument("--model", default="llama3.2:latest")
+    parser.add_argument("--no-summarize", dest="summarize", action="store_false", help="turn the running summary off")
+    parser.add_argument("--fake", action="store_true", help="use the fake Ollama with a modelled prompt cache")
+    parser.add_argument("--cache-slots", type=int, default=1, help="prompt cache slots of the fake Ollama")
+    args = parser.parse_args()
+
+    use_server_dir()
+    import ollama
+
+    for mode in ("sliding", "stable"):
+        fake = None
+        if args.fake:
+            from benchmarks.fakeOllama import FakeOllama
+
+            fake = FakeOllama(firstTokenLatency=0, tokenRate=2000, replyTokens=60, cacheSlots=args.cache_slots).start()
+        client = ollama.Client(host=fake.url if fake else None)
+        rows, summaries = run(mode, args, client)
+        if fake:
+            fake.stop()
+
+        print(f"\n{mode} prefix")
+        print(f"{'turn':>4}{'prompt tokens':>15}{'prefill ms':>12}{'total s':>10}")
+        for turn, evaluated, prefill, total in rows:
+            print(f"{turn:>4}{evaluated:>15}{prefill:>12.1f}{total:>10.2f}")
+        print(f"mean prefill {sum(r[2] for r in rows) / len(rows):.1f} ms, {sum(r[1] for r in rows)} prompt tokens evaluated")
+        if args.summarize:
+            print(f"{len(summaries)} summary calls, {sum(summaries)} prompt tokens evaluated for them")
+
+
+if __name__ == "__main__":
+    main()
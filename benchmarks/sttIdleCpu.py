@@ -0,0 +1,72 @@
+"""CPU used by the client's speech-to-text thread while idle and while listening.
+
+Needs the client dependencies, the Vosk model and a microphone, i.e. run it on the handheld from
+the repository root:
+    python -m benchmarks.sttIdleCpu [--seconds 10] [--baseline]
+
+--baseline also measures a loop that polls the queue without blocking, like the thread used to.
+"""
+import argparse, queue, resource, threading, time
+from benchmarks import use_client_dir
+
+
+def measure(seconds):
+    """Process CPU time as a share of one core, and voluntary context switches (wakeups) per second."""
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    cpu = time.process_time()
+    time.sleep(seconds)
+    cpu = time.process_time() - cpu
+    wakeups = resource.getrusage(resource.RUSAGE_SELF).ru_nvcsw - usage.ru_nvcsw
+    return cpu / seconds * 100, wakeups / seconds
+
+
+def polling_loop(stop):
+    """What the thread did before: check the queue and the flag as fast as possible."""
+    frames = queue.Queue()
+    isListening = False
+    while not stop.is_set():
+        if isListening:
+            if not frames.empty():
+                frames.get()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=10.0, help="length of every measurement")
+    parser.add_argument("--baseline", action="store_true", help="also measure the old polling loop")
+    args = parser.parse_args()
+
+    use_client_dir()
+    from PyQt5.QtCore import QCoreApplication
+    import main as client
+
+    app = QCoreApplication([])
+    rows = []
+
+    rows.append(("nothing running", *measure(args.seconds)))
+
+    stt = client.SpeechToTextThread()
+    stt.start()
+    while not stt.ready and not stt.isFinished():  # model loaded and input stream open
+        time.sleep(0.1)
+    time.sleep(1)
+    rows.append(("stt idle", *measure(args.seconds)))
+
+    stt.isListening = True
+    rows.append(("stt listening", *measure(args.seconds)))
+    stt.isListening = False
+
+    if args.baseline:
+        stop = threading.Event()
+        threading.Thread(target=polling_loop, args=(stop,), daemon=True).start()
+        rows.append(("old polling loop", *measure(args.seconds)))
+        stop.set()
+
+    print(f"{'':<18}{'cpu %':>8}{'wakeups/s':>12}")
+    for label, cpu, wakeups in rows:
+        print(f"{label:<18}{cpu:>8.1f}{wakeups:>12.1f}")
+    app.quit()
+
+
+if __name__ == "__main__":
+    main()
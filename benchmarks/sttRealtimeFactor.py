@@ -0,0 +1,70 @@
+"""Real-time factor of the on-device recognizer fed at the microphone's rate vs resampled to 16 kHz.
+
+Needs vosk, numpy and the client's Vosk model. Pass a mono 16-bit recording of speech; it is first
+brought to --device-rate to stand in for the microphone. Run from the repository root:
+    python -m benchmarks.sttRealtimeFactor --wav speech.wav [--device-rate 48000]
+"""
+import argparse, json, time, wave
+from benchmarks import use_client_dir
+
+BLOCK_FRAMES = 2048  # same block size as the client's input stream
+
+
+def blocks(pcm, frames=BLOCK_FRAMES):
+    step = frames * 2
+    return [pcm[i : i + step] for i in range(0, len(pcm), step)]
+
+
+def recognize(model, pcm, samplerate, resampler=None):
+    """Feed pcm block by block like the client does, returns (seconds spent, resampling seconds, text)."""
+    from vosk import KaldiRecognizer
+
+    recognizer = KaldiRecognizer(model, samplerate if resampler is None else resampler.outputRate)
+    spent = resampling = 0.0
+    for block in blocks(pcm):
+        started = time.perf_counter()
+        if resampler is not None:
+            block = resampler.process(block)
+            resampling += time.perf_counter() - started
+        recognizer.AcceptWaveform(block)
+        spent += time.perf_counter() - started
+    started = time.perf_counter()
+    text = json.loads(recognizer.FinalResult()).get("text", "")
+    return spent + time.perf_counter() - started, resampling, text
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--wav", required=True, help="mono 16-bit speech recording")
+    parser.add_argument("--device-rate", type=int, default=48000, help="rate the microphone captures at")
+    parser.add_argument("--model", default="vosk-model-small-en-us-0.15")
+    args = parser.parse_args()
+
+    use_client_dir()
+    from vosk import Model, SetLogLevel
+    from audioResampler import RECOGNIZER_SAMPLERATE, PolyphaseResampler
+
+    with wave.open(args.wav, "rb") as wav:
+        if wav.getnchannels() != 1 or wav.getsampwidth() != 2:
+            raise SystemExit("Expected a mono 16-bit wav file")
+        rate = wav.getframerate()
+        pcm = wav.readframes(wav.getnframes())
+
+    device = PolyphaseResampler(rate, args.device_rate).process(pcm) if rate != args.device_rate else pcm
+    duration = len(device) / 2 / args.device_rate
+
+    SetLogLevel(-1)
+    model = Model(model_name=args.model)
+    before, _, textBefore = recognize(model, device, args.device_rate)
+    after, resampling, textAfter = recognize(model, device, args.device_rate, PolyphaseResampler(args.device_rate, RECOGNIZER_SAMPLERATE))
+
+    print(f"{duration:.1f} s of audio at {args.device_rate} Hz, recognized in {BLOCK_FRAMES}-frame blocks")
+    print(f"{'':<26}{'seconds':>10}{'RTF':>8}")
+    print(f"{f'recognizer at {args.device_rate} Hz':<26}{before:>10.2f}{before / duration:>8.3f}")
+    print(f"{f'resampled to {RECOGNIZER_SAMPLERATE} Hz':<26}{after:>10.2f}{after / duration:>8.3f}")
+    print(f"{'  of which resampling':<26}{resampling:>10.2f}{resampling / duration:>8.3f}")
+    print(f"\nat {args.device_rate} Hz: {textBefore}\nat {RECOGNIZER_SAMPLERATE} Hz: {textAfter}")
+
+
+if __name__ == "__main__":
+    main()
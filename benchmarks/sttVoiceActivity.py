@@ -0,0 +1,81 @@
+"""Recognizer time with and without the client's voice activity detection, and when the utterance ends.
+
+Needs vosk, numpy and the client's Vosk model. Pass a mono 16-bit recording of one utterance; it is
+padded with --lead and --trail seconds of room noise like a press of the button would capture.
+Run from the repository root:
+    python -m benchmarks.sttVoiceActivity --wav speech.wav [--lead 1 --trail 3 --noise 80]
+"""
+import argparse, json, time, wave
+import numpy as np
+from benchmarks import use_client_dir
+
+BLOCK_FRAMES = 683  # a 2048-frame block at 48 kHz after resampling to 16 kHz
+
+
+def recognize(model, pcm, samplerate, vad=None):
+    """Returns (recognizer seconds, seconds of audio consumed when the utterance ended, text)."""
+    from vosk import KaldiRecognizer
+
+    recognizer = KaldiRecognizer(model, samplerate)
+    spent = consumed = 0.0
+    for i in range(0, len(pcm), BLOCK_FRAMES * 2):
+        block = pcm[i : i + BLOCK_FRAMES * 2]
+        consumed += len(block) / 2 / samplerate
+        started = time.perf_counter()
+        blocks, ended = vad.process(block) if vad else ([block], False)
+        for data in blocks:
+            recognizer.AcceptWaveform(data)
+        spent += time.perf_counter() - started
+        if ended:
+            break
+    started = time.perf_counter()
+    text = json.loads(recognizer.FinalResult()).get("text", "")
+    return spent + time.perf_counter() - started, consumed, text
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--wav", required=True, help="mono 16-bit recording of one utterance")
+    parser.add_argument("--lead", type=float, default=1.0, help="seconds of noise before the speech")
+    parser.add_argument("--trail", type=float, default=3.0, help="seconds of noise after it, until the release")
+    parser.add_argument("--noise", type=float, default=80.0, help="RMS of the room noise")
+    parser.add_argument("--model", default="vosk-model-small-en-us-0.15")
+    args = parser.parse_args()
+
+    use_client_dir()
+    from vosk import Model, SetLogLevel
+    from audioResampler import RECOGNIZER_SAMPLERATE, PolyphaseResampler
+    from voiceActivity import VoiceActivityDetector
+    from main import VAD_TRAILING_SILENCE
+
+    with wave.open(args.wav, "rb") as wav:
+        if wav.getnchannels() != 1 or wav.getsampwidth() != 2:
+            raise SystemExit("Expected a mono 16-bit wav file")
+        rate = wav.getframerate()
+        pcm = wav.readframes(wav.getnframes())
+    if rate != RECOGNIZER_SAMPLERATE:
+        pcm = PolyphaseResampler(rate, RECOGNIZER_SAMPLERATE).process(pcm)
+
+    noise = np.random.default_rng(0).normal(0, args.noise, int((args.lead + args.trail) * RECOGNIZER_SAMPLERATE))
+    noise = np.clip(noise, -32768, 32767).astype(np.int16)
+    lead = int(args.lead * RECOGNIZER_SAMPLERATE)
+    pcm = noise[:lead].tobytes() + pcm + noise[lead:].tobytes()
+    duration = len(pcm) / 2 / RECOGNIZER_SAMPLERATE
+    speechEnd = duration - args.trail
+
+    SetLogLevel(-1)
+    model = Model(model_name=args.model)
+    vad = VoiceActivityDetector(RECOGNIZER_SAMPLERATE, VAD_TRAILING_SILENCE)
+    rows = [("every block", *recognize(model, pcm, RECOGNIZER_SAMPLERATE)), ("with VAD", *recognize(model, pcm, RECOGNIZER_SAMPLERATE, vad))]
+
+    print(f"{duration:.1f} s held, speech ends at {speechEnd:.1f} s")
+    print(f"{'':<14}{'recognizer s':>14}{'ended after speech s':>22}")
+    for label, spent, consumed, _ in rows:
+        print(f"{label:<14}{spent:>14.2f}{consumed - speechEnd:>22.2f}")
+    print(f"VAD dropped {vad.droppedSeconds:.1f} s, passed {vad.passedSeconds:.1f} s")
+    for label, _, _, text in rows:
+        print(f"{label}: {text}")
+
+
+if __name__ == "__main__":
+    main()
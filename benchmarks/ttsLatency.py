@@ -0,0 +1,85 @@
+"""Compare per-reply TTS latency and audio size of the old ffmpeg file path with the in-process mp3 and pcm paths.
+
+The old path is the one TTS_Pyttsx3 used to take: wav file, ffmpeg spawned to write an mp3 file, mp3 read back.
+Run from the repository root:  python -m benchmarks.ttsLatency [--runs 5]
+"""
+import argparse, os, statistics, subprocess, tempfile, time, wave
+from benchmarks import use_server_dir, percentile
+
+REPLIES = [
+    "Hello! I am ZELNA, your handheld assistant.",
+    "Response could not be generated :(",
+    "The weather today looks sunny with a light breeze from the west, perfect for a walk outside.",
+    "Sure! Here is a short story. Once upon a time a tiny robot lived in a pocket. "
+    "Every morning it woke up, stretched its little arms and asked what the day would bring.",
+]
+
+
+def synthesize_mp3_file(pool, text, tempDir):
+    """The old path: the speech as a wav file, ffmpeg converts it to an mp3 file, the mp3 is read back."""
+    speech = pool.synthesize(text, "pcm")
+    if speech is None:
+        return None
+    pcm, info = speech
+    wavPath = os.path.join(tempDir, "output.wav")
+    mp3Path = os.path.join(tempDir, "output.mp3")
+    with wave.open(wavPath, "wb") as wav:
+        wav.setnchannels(info["channels"])
+        wav.setsampwidth(2)
+        wav.setframerate(info["samplerate"])
+        wav.writeframes(pcm)
+    subprocess.run(["ffmpeg", "-y", "-i", wavPath, mp3Path], check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    with open(mp3Path, "rb") as mp3:
+        return mp3.read(), {"format": "mp3"}
+
+
+def measure(synthesize, runs):
+    """Return per-reply latencies in milliseconds and the average audio size in bytes."""
+    latencies, sizes = [], []
+    for _ in range(runs):
+        for text in REPLIES:
+            start = time.perf_counter()
+            speech = synthesize(text)
+            latencies.append((time.perf_counter() - start) * 1000)
+            if speech is None:
+                raise RuntimeError("TTS failed")
+            sizes.append(len(speech[0]))
+    return latencies, statistics.mean(sizes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="times every reply is synthesized per path")
+    args = parser.parse_args()
+
+    use_server_dir()
+    from ttsWorkers import TTSWorkerPool
+    import zelnaServer
+
+    # one worker so all paths run on the same warmed-up engine
+    pool = TTSWorkerPool(1, zelnaServer.TTS_VOICE_ID, zelnaServer.TTS_RATE, mp3Bitrate=zelnaServer.MP3_BITRATE)
+    pool.start()
+    pool.synthesize("warm up", "pcm")
+    tempDir = tempfile.mkdtemp(prefix="zelna-tts-")
+
+    paths = [
+        ("old mp3", lambda text: synthesize_mp3_file(pool, text, tempDir)),
+        ("mp3", lambda text: pool.synthesize(text, "mp3")),
+        ("pcm", lambda text: pool.synthesize(text, "pcm")),
+    ]
+    print(f"{'path':<9}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'avg bytes':>12}")
+    for name, synthesize in paths:
+        try:
+            latencies, size = measure(synthesize, args.runs)
+        except FileNotFoundError:
+            print(f"{name:<9}  skipped, ffmpeg is not installed")
+            continue
+        print(
+            f"{name:<9}{statistics.mean(latencies):>10.1f}"
+            f"{percentile(latencies, 50):>10.1f}{percentile(latencies, 95):>10.1f}{size:>12.0f}"
+        )
+    pool.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,132 @@
-import sys
+import sys, threading, time
+
 
 class FakeGPIO:
+    """Stand-in for RPi.GPIO off the Pi, and a simulator to drive the pins from a script.
+
+    Pins with a pull-up read HIGH until set_level, press or bounce change them. Edge callbacks run
+    on the thread that changed the level, as RPi.GPIO runs them on its own event thread.
+    """
+
     BCM = "BCM"
+    BOARD = "BOARD"
     IN = "IN"
+    OUT = "OUT"
     PUD_UP = "PUD_UP"
+    PUD_DOWN = "PUD_DOWN"
+    HIGH = 1
+    LOW = 0
+    RISING = "RISING"
+    FALLING = "FALLING"
+    BOTH = "BOTH"
+
+    def __init__(self, verbose=True):
+        self.verbose = verbose
+        self.lock = threading.Lock()
+        self.levels = {}
+        self.detectors = {}  # pin -> {"edge", "callbacks", "bouncetime", "lastCall"}
+        self.edges = 0  # edges injected so far
+
+    def log(self, text):
+        if self.verbose:
+            print(text)
 
     def setmode(self, mode):
-        print(f"GPIO mode set to {mode}")
+        self.log(f"GPIO mode set to {mode}")
 
-    def setup(self, pin, mode, pull_up_down=None):
-        print(f"GPIO pin {pin} set up as {mode}")
+    def setup(self, pin, mode, pull_up_down=None, initial=None):
+        with self.lock:
+            if initial is not None:
+                self.levels[pin] = initial
+            else:
+                self.levels[pin] = self.LOW if pull_up_down == self.PUD_DOWN else self.HIGH
+        self.log(f"GPIO pin {pin} set up as {mode}")
 
     def input(self, pin):
-        return 1  # Simulate a HIGH signal (button not pressed)
+        return self.levels.get(pin, self.HIGH)  # HIGH is a released button
+
+    def add_event_detect(self, pin, edge, callback=None, bouncetime=None):
+        with self.lock:
+            if pin in self.detectors:
+                raise RuntimeError("Conflicting edge detection already enabled for this GPIO channel")
+            self.detectors[pin] = {
+                "edge": edge,
+                "callbacks": [callback] if callback else [],
+                "bouncetime": (bouncetime or 0) / 1000,
+                "lastCall": None,
+            }
+
+    def add_event_callback(self, pin, callback):
+        with self.lock:
+            if pin not in self.detectors:
+                raise RuntimeError("Add event detection using add_event_detect first before adding a callback")
+            self.detectors[pin]["callbacks"].append(callback)
+
+    def remove_event_detect(self, pin):
+        with self.lock:
+            self.detectors.pop(pin, None)
+
+    def cleanup(self, pin=None):
+        with self.lock:
+            if pin is None:
+                self.detectors.clear()
+            else:
+                self.detectors.pop(pin, None)
+        self.log("GPIO cleanup")
+
+    # simulator
+
+    def set_level(self, pin, level):
+        """Drive a pin, runs the edge callbacks if the level changed."""
+        with self.lock:
+            previous = self.levels.get(pin, self.HIGH)
+            self.levels[pin] = level
+            if previous == level:
+                return
+            self.edges += 1
+            detector = self.detectors.get(pin)
+            if detector is None or detector["edge"] not in (self.BOTH, self.FALLING if level == self.LOW else self.RISING):
+                return
+            now = time.monotonic()
+            if detector["lastCall"] is not None and now - detector["lastCall"] < detector["bouncetime"]:
+                return
+            detector["lastCall"] = now
+            callbacks = list(detector["callbacks"])
+
+        for callback in callbacks:
+            callback(pin)
+
+    def press(self, pin):
+        self.set_level(pin, self.LOW)  # buttons pull the pin to ground
+
+    def release(self, pin):
+        self.set_level(pin, self.HIGH)
+
+    def bounce(self, pin, level, edges=6, interval=0.0005):
+        """Chatter like a mechanical contact, then settle at level."""
+        for i in range(edges):
+            self.set_level(pin, level if i % 2 == 0 else 1 - level)
+            time.sleep(interval)
+        self.set_level(pin, level)
+
+    def play(self, script):
+        """Run a list of (seconds from now, pin, level) on a thread, returns the thread."""
+
+        def run():
+            started = time.monotonic()
+            for at, pin, level in sorted(script, key=lambda step: step[0]):
+                time.sleep(max(0, started + at - time.monotonic()))
+                self.set_level(pin, level)
+
+        thread = threading.Thread(target=run, name="fake-gpio-script", daemon=True)
+        thread.start()
+        return thread
 
-    def cleanup(self):
-        print("GPIO cleanup")
 
 if sys.platform == "win32":
     GPIO = FakeGPIO()
 else:
-    import RPi.GPIO as GPIO
+    try:
+        import RPi.GPIO as GPIO
+    except ImportError:  # a plain Linux box, buttons only move when driven by the simulator
+        GPIO = FakeGPIO()
@@ -0,0 +1,70 @@
+"""Microphone capture at the sample rate the recognizer wants, resampling in NumPy when the device can't."""
+from math import gcd
+import numpy as np
+
+RECOGNIZER_SAMPLERATE = 16000  # what the Vosk models are trained on
+
+
+def choose_capture_rate(sounddevice, device=None, target=RECOGNIZER_SAMPLERATE):
+    """Return target if the input device can capture at it, else the device's default rate."""
+    try:
+        sounddevice.check_input_settings(device=device, samplerate=target, channels=1, dtype="int16")
+        return target
+    except Exception:
+        return int(sounddevice.query_devices(device, "input")["default_samplerate"])
+
+
+class PolyphaseResampler:
+    """Streaming rational resampler for int16 mono blocks, e.g. 48000 -> 16000 or 44100 -> 16000.
+
+    The rate change is up/down in lowest terms. A windowed-sinc low-pass is split into `up` phases
+    and every output sample is one dot product of a phase with the newest input samples, computed
+    for a whole block at once. Input that later blocks still need is carried over between calls.
+    """
+
+    def __init__(self, inputRate, outputRate=RECOGNIZER_SAMPLERATE, tapsPerPhase=24):
+        divisor = gcd(inputRate, outputRate)
+        self.inputRate = inputRate
+        self.outputRate = outputRate
+        self.up = outputRate // divisor
+        self.down = inputRate // divisor
+        self.taps = tapsPerPhase
+
+        # Low-pass at the lower of the two Nyquist rates, designed at the upsampled rate
+        length = self.up * tapsPerPhase
+        cutoff = 0.5 / max(self.up, self.down) * 0.9
+        n = np.arange(length) - (length - 1) / 2
+        h = 2 * cutoff * np.sinc(2 * cutoff * n) * np.kaiser(length, 8.0) * self.up
+        self.phases = h.reshape(tapsPerPhase, self.up).T.astype(np.float32)  # phases[p, k] = h[p + k * up]
+
+        self.buffer = np.zeros(tapsPerPhase - 1, dtype=np.float32)  # input history, zeros before the start
+        self.bufferStart = -(tapsPerPhase - 1)  # input index of buffer[0]
+        self.inputCount = 0
+        self.outputCount = 0
+
+    def process(self, data):
+        """Resample a block of int16 bytes, returns int16 bytes at the output rate."""
+        if self.up == self.down:
+            return data
+
+        block = np.frombuffer(data, dtype=np.int16).astype(np.float32)
+        self.buffer = np.concatenate((self.buffer, block))
+        self.inputCount += len(block)
+
+        # every output sample whose newest input sample has arrived
+        lastOutput = (self.inputCount * self.up - 1) // self.down
+        outputs = np.arange(self.outputCount, lastOutput + 1)
+        if len(outputs) == 0:
+            return b""
+        position = outputs * self.down
+        newest = position // self.up - self.bufferStart
+        window = self.buffer[newest[:, None] - np.arange(self.taps)[None, :]]
+        samples = np.einsum("ij,ij->i", window, self.phases[position % self.up])
+        self.outputCount = lastOutput + 1
+
+        # keep the history the next output sample needs
+        keepFrom = (self.outputCount * self.down) // self.up - (self.taps - 1)
+        self.buffer = self.buffer[keepFrom - self.bufferStart :]
+        self.bufferStart = keepFrom
+
+        return np.clip(np.rint(samples), -32768, 32767).astype(np.int16).tobytes()
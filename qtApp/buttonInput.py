@@ -0,0 +1,119 @@
+"""Buttons on GPIO pins, reported from edge interrupts instead of polling."""
+import threading, time
+
+
+class ButtonInput:
+    """Report presses and releases of active-low buttons from GPIO edge callbacks.
+
+    The first edge is reported at once and later edges on that pin are ignored for `debounce`
+    seconds. When that window ends the pin is read again, so a bounce that settles in the other
+    state is still reported. A held button with a repeat interval fires onPress again after
+    repeatDelay and then every repeatInterval. All handlers run in order on one worker thread,
+    which sleeps until an edge or a deadline arrives.
+    """
+
+    def __init__(self, gpio, debounce=0.02):
+        self.gpio = gpio
+        self.debounce = debounce
+        self.buttons = {}  # pin -> state, see add
+        self.events = []  # handlers waiting for the worker
+        self.condition = threading.Condition()
+        self.running = False
+        self.thread = None
+
+    def add(self, pin, onPress, onRelease=None, repeatDelay=None, repeatInterval=None):
+        self.buttons[pin] = {
+            "onPress": onPress,
+            "onRelease": onRelease,
+            "repeatDelay": repeatDelay,
+            "repeatInterval": repeatInterval,
+            "pressed": False,
+            "lockedUntil": 0.0,  # edges before this are bounce
+            "checkAt": None,  # read the pin again at the end of the debounce window
+            "nextRepeat": None,
+        }
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="button-input", daemon=True)
+        self.thread.start()
+        for pin, button in self.buttons.items():
+            self.gpio.setup(pin, self.gpio.IN, pull_up_down=self.gpio.PUD_UP)
+            button["pressed"] = self.isDown(pin)
+            self.gpio.add_event_detect(pin, self.gpio.BOTH, callback=self._edge)
+
+    def stop(self):
+        for pin in self.buttons:
+            try:
+                self.gpio.remove_event_detect(pin)
+            except Exception:
+                pass
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        if self.thread is not None:
+            self.thread.join(1)
+
+    def isDown(self, pin):
+        return self.gpio.input(pin) == self.gpio.LOW
+
+    def _edge(self, pin):
+        """Edge callback, on the GPIO library's thread"""
+        now = time.monotonic()
+        down = self.isDown(pin)
+        with self.condition:
+            button = self.buttons.get(pin)
+            if button is None or now < button["lockedUntil"]:
+                return
+            if down != button["pressed"]:
+                self._change(button, down, now)
+            else:
+                button["checkAt"] = now + self.debounce  # a glitch that is already over, check again later
+            self.condition.notify()
+
+    def _change(self, button, down, now):
+        button["pressed"] = down
+        button["lockedUntil"] = now + self.debounce
+        button["checkAt"] = now + self.debounce
+        handler = button["onPress"] if down else button["onRelease"]
+        if handler is not None:
+            self.events.append(handler)
+        if down and button["repeatInterval"]:
+            button["nextRepeat"] = now + (button["repeatDelay"] or button["repeatInterval"])
+        else:
+            button["nextRepeat"] = None
+
+    def _due(self, now):
+        """Settle checks and repeats that are due, returns seconds until the next one or None"""
+        deadlines = []
+        for pin, button in self.buttons.items():
+            if button["checkAt"] is not None and now >= button["checkAt"]:
+                button["checkAt"] = None
+                down = self.isDown(pin)
+                if down != button["pressed"]:
+                    self._change(button, down, now)
+
+            if button["nextRepeat"] is not None and now >= button["nextRepeat"]:
+                self.events.append(button["onPress"])
+                button["nextRepeat"] = max(button["nextRepeat"] + button["repeatInterval"], now)
+
+            deadlines += [d for d in (button["checkAt"], button["nextRepeat"]) if d is not None]
+        return max(0.0, min(deadlines) - now) if deadlines else None
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while self.running:
+                    timeout = self._due(time.monotonic())
+                    if self.events:
+                        break
+                    self.condition.wait(timeout)
+                if not self.running:
+                    return
+                events, self.events = self.events, []
+
+            for handler in events:
+                try:
+                    handler()
+                except Exception as e:
+                    print(f"Button handler failed: {str(e)}")
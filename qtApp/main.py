@@ -1,33 +1,106 @@
-import sys, time, socketio, sounddevice, queue, json, base64, os, subprocess, threading
+import sys, time, queue, json, base64, os, subprocess, threading, platform, uuid
 
-# Import GPIO library based on platform
-if sys.platform == "win32":
-    from FakeGPIO import GPIO
-else:
-    import RPi.GPIO as GPIO
+STARTUP_STARTED = time.perf_counter()
 
-from vosk import Model, KaldiRecognizer
+# Import GPIO library based on platform, FakeGPIO simulates the buttons where RPi.GPIO is missing
+from FakeGPIO import GPIO
+
+from buttonInput import ButtonInput
 from PyQt5.QtCore import Qt, QThread, pyqtSignal, QTimer
 from PyQt5.QtWidgets import QWidget, QApplication, QVBoxLayout
 from widgets.ChatBox import ChatBox
 from widgets.MessageBox import MessageBox
 from resources.Theme import UI
 
+# vosk, socketio, sounddevice and numpy (audioResampler, voiceActivity) are slow to import on the Pi,
+# they are imported by the threads that use them so the window shows first
+
+# Server events that belong to one request, dropped when they are for an older request
+REQUEST_EVENTS = ["queue_status", "busy", "response_chunk", "response_audio", "audio_chunk", "response", "action"]
+
 # Define constant for placeholder text
 MESSAGE_PLACEHOLDER_TEXT = " ( > w < ) "
-
-# initialize socketio client
-sio = socketio.Client(
-    reconnection=True,
-    reconnection_attempts=-1,
-    reconnection_delay=1,
-    reconnection_delay_max=5,
-)
+SHOW_TIMINGS = False  # show the server's per-stage timings of every reply in the chat
+PCM_WRITE_BLOCK_BYTES = 4096  # pcm is written in small blocks so playback can be stopped quickly
+MIXER_CONTROL = "Master"  # ALSA control changed by "volume up" / "volume down"
+VOLUME_STEP = 10  # percent per "volume up" / "volume down"
+SERVER_STT = False  # stream the microphone to the server and let its larger model do speech recognition
+VAD_ENABLED = True  # drop silent blocks before they reach the recognizer
+VAD_TRAILING_SILENCE = 0.8  # seconds of silence after speech that finish the utterance, button held or not
+HANDS_FREE = False  # the power button toggles listening, every utterance is ended by VAD_TRAILING_SILENCE
+POWER_PIN = 26  # BCM pins of the buttons, wired to ground
+UP_PIN = 6
+DOWN_PIN = 5
+BUTTON_DEBOUNCE = 0.02  # seconds during which further edges of a button are contact bounce
+SCROLL_REPEAT_DELAY = 0.4  # a held up / down button starts repeating after this many seconds
+SCROLL_REPEAT_INTERVAL = 0.15  # and then scrolls again every this many seconds
+DEVICE_ID_FILE = os.path.join(os.path.expanduser("~"), ".zelna_device_id")  # id of this handheld when it has no board serial
+
+sio = None  # socketio client, created by SocketThread
+
+
+def createSocketClient():
+    global sio
+    import socketio
+
+    sio = socketio.Client(
+        reconnection=True,
+        reconnection_attempts=-1,
+        reconnection_delay=1,
+        reconnection_delay_max=5,
+    )
+    return sio
+
+
+def serverConnected():
+    return sio is not None and sio.connected
+
+
+def deviceId():
+    """Name of this handheld's session on the server. Handhelds flashed from one image share a hostname,
+    and a stored file too if the image was taken after a first run, so the board's serial number comes
+    first, then a uuid stored on first run, and the hostname only if neither can be had"""
+    try:
+        with open("/proc/cpuinfo") as file:
+            for line in file:
+                if line.startswith("Serial"):
+                    serial = line.split(":", 1)[1].strip().lstrip("0")
+                    if serial:
+                        return f"pi-{serial}"
+    except OSError:
+        pass
+
+    try:
+        with open(DEVICE_ID_FILE) as file:
+            storedId = file.read().strip()
+        if storedId:
+            return storedId
+    except OSError:
+        pass
+
+    try:
+        newId = uuid.uuid4().hex
+        with open(DEVICE_ID_FILE, "w") as file:
+            file.write(newId + "\n")
+        return newId
+    except OSError as e:
+        print(f"Couldn't store a device id, using the hostname: {str(e)}")
+        return platform.node()
+
+
+def logStartupPhase(phase, started=None):
+    """Print how long after launch a startup phase finished, and how long the phase itself took"""
+    now = time.perf_counter()
+    took = f" (took {(now - started) * 1000:.0f} ms)" if started is not None else ""
+    print(f"Startup: {phase} at {(now - STARTUP_STARTED) * 1000:.0f} ms{took}")
 
 
 class mainWindow(QWidget):
     def __init__(self):
         self.ResponseGenerationActive = False
+        self.currentRequestId = None  # request id of the message the user is waiting for
+        self.sttReady = False  # push-to-talk is ignored until the speech model is loaded
+        self.startupPending = {"model": "Loading speech model", "server": "Connecting to the server"}
         super().__init__()
         self.initUI()
         self.initThreads()
@@ -53,7 +126,7 @@ class mainWindow(QWidget):
         layout.addWidget(self.messageBox)
         self.setLayout(layout)
 
-        self.messageBox.updateText(MESSAGE_PLACEHOLDER_TEXT)
+        self.messageBox.updateText(self.idleText())
 
     def initThreads(self):
         # Initialize threads
@@ -68,6 +141,11 @@ class mainWindow(QWidget):
         self.speechToTextThread.sttSignal.connect(self.handleStt)
         self.textToSpeechThread.ttsSignal.connect(self.handleTts)
 
+        # hands-free, the microphone would otherwise hear the reply
+        self.speechToTextThread.muteWhile = self.isReplyActive
+
+    def startThreads(self):
+        """Started once the window is on screen, the model and the connection load in the background"""
         self.socketThread.start()
         self.gpioThread.start()
         self.speechToTextThread.start()
@@ -81,36 +159,116 @@ class mainWindow(QWidget):
 
         event.accept()
 
+    def idleText(self):
+        """Placeholder for the message box, or what is still loading while the app starts"""
+        if self.startupPending:
+            return "\n".join(f"{step} ..." for step in self.startupPending.values())
+        return MESSAGE_PLACEHOLDER_TEXT
+
+    def startupStepDone(self, step):
+        if self.startupPending.pop(step, None) and not self.ResponseGenerationActive:
+            self.messageBox.updateText(self.idleText())
+
     # callbacks
     def handleSocket(self, eventName, data):
+        if eventName in REQUEST_EVENTS and isinstance(data, dict):
+            requestId = data.get("requestId")
+            if requestId and requestId != self.currentRequestId:
+                return  # left over from a cancelled request
+
+            if data.get("timings"):
+                self.showTimings(data.get("timings"))
+
+        if eventName == "connected":
+            self.startupStepDone("server")
+
         if eventName == "initialize":
             self.chatBox.clearMessages()
             self.chatBox.initMessages(data)
+            self.setLastMessageId(max([0] + [m.get("id") or 0 for m in data]))
+            self.setResponseGenerationActive(False)
+
+        if eventName == "sync":
+            # only the messages missed while disconnected, they include the ones shown before their reply
+            self.chatBox.syncMessages(data)
+            if data:
+                self.setLastMessageId(data[-1].get("id"))
             self.setResponseGenerationActive(False)
 
         if eventName == "message":
             self.chatBox.addMessage(data.get("message"), data.get("sender"))
 
+        if eventName == "stt_result":
+            # speech recognized on the server (SERVER_STT), same events as the local recognizer
+            self.handleStt(data.get("event"), data)
+
+        if eventName == "queue_status":
+            self.messageBox.updateText(
+                f"Waiting for the server, position {data.get('position')} ..."
+            )
+
+        if eventName == "busy":
+            self.chatBox.addMessage(data.get("message"), "info")
+            self.setResponseGenerationActive(False)
+
+        if eventName == "response_chunk":
+            # grow the server bubble while the reply is being streamed
+            self.chatBox.appendStreamingMessage(data.get("message"), data.get("sender"))
+
+        if eventName == "response_audio":
+            # audio segments of a streamed reply, queued and played back to back
+            if data.get("audio_file"):
+                self.textToSpeechThread.queue_audio(data.get("audio_file"), data)
+            if data.get("final"):
+                self.textToSpeechThread.end_audio_stream()
+
+        if eventName == "audio_chunk":
+            # binary audio, played while the rest of the reply is still arriving
+            self.textToSpeechThread.queue_audio_chunk(data)
+
+        if eventName == "action":
+            # a command answered by the server without the LLM
+            self.handleAction(data)
+
         if eventName == "response":
-            self.chatBox.addMessage(
-                data.get("message"), data.get("sender")
-            )  # send message to chatbox
+            if data.get("message"):
+                self.chatBox.finishStreamingMessage(
+                    data.get("message"), data.get("sender")
+                )  # send message to chatbox
+            else:
+                self.chatBox.endStreamingMessage()  # commands like "scroll up" have no reply text
+
+            if data.get("id"):
+                self.setLastMessageId(data.get("id"))
+                self.chatBox.confirmMessages()
 
             audio_file = data.get("audio_file")  # get and play audio file from server
             if audio_file:
-                self.textToSpeechThread.play_audio(audio_file)
+                self.textToSpeechThread.play_audio(audio_file, data)
 
             self.setResponseGenerationActive(False)
 
     def handleGpio(self, eventName):
         if eventName == "powerButtonPressed":
-            if self.textToSpeechThread.is_playing_audio():
-                self.textToSpeechThread.stop_playback()
-
-            if not self.ResponseGenerationActive:
+            if not self.sttReady:
+                self.messageBox.updateText("Speech recognition is still loading ...")
+                return
+
+            # a new utterance interrupts the reply that is being generated or played
+            if self.isReplyActive():
+                self.cancelCurrentRequest()
+                if HANDS_FREE:
+                    return  # still listening, the press only stopped the reply
+
+            if HANDS_FREE:
+                self.speechToTextThread.isListening = not self.speechToTextThread.isListening
+                self.chatBox.addMessage(
+                    "Listening" if self.speechToTextThread.isListening else "Stopped listening", "info"
+                )
+            else:
                 self.speechToTextThread.isListening = True
 
-        if eventName == "powerButtonReleased":
+        if eventName == "powerButtonReleased" and not HANDS_FREE:
             self.speechToTextThread.isListening = False
 
         if eventName == "upButton":
@@ -119,17 +277,59 @@ class mainWindow(QWidget):
         if eventName == "downButton":
             self.chatBox.scrollDown(duration=100, scrollAmount=300)
 
+    def handleAction(self, data):
+        action = data.get("action")
+        direction = data.get("direction")
+
+        if action == "scroll" and direction == "up":
+            self.chatBox.scrollUp(duration=100, scrollAmount=300)
+
+        if action == "scroll" and direction == "down":
+            self.chatBox.scrollDown(duration=100, scrollAmount=300)
+
+        if action == "volume":
+            self.changeVolume(direction)
+
+    def changeVolume(self, direction):
+        change = {
+            "up": f"{VOLUME_STEP}%+",
+            "down": f"{VOLUME_STEP}%-",
+            "mute": "mute",
+            "unmute": "unmute",
+        }.get(direction)
+        if change is None:
+            return
+        try:
+            subprocess.run(["amixer", "-q", "sset", MIXER_CONTROL, change], check=True, timeout=2)
+        except Exception as e:
+            print(f"Failed to change volume: {str(e)}")
+
     def handleStt(self, eventName, data):
+        if eventName == "ready":
+            self.sttReady = True
+            self.startupStepDone("model")
+
         if eventName == "message":
             self.chatBox.addMessage(data.get("message"), "info")
+            if not self.sttReady:
+                self.startupStepDone("model")  # loading failed, the error is in the chat
 
         if eventName == "partialResult":
             if not self.ResponseGenerationActive:
                 self.messageBox.updateText(data.get("message"))
 
         if eventName == "finalResult":
+            if not data.get("message"):
+                self.messageBox.updateText(MESSAGE_PLACEHOLDER_TEXT)
+                return
+
             self.messageBox.updateText(data.get("message"))
 
+            if data.get("requestId"):
+                # recognized on the server, which is already generating the reply
+                self.acceptServerTranscript(data)
+                return
+
             # delay to allow message to be displayed on messageBox for a while
             QTimer.singleShot(500, lambda: self.DelayedCallbackForHandleStt(data))
 
@@ -139,8 +339,43 @@ class mainWindow(QWidget):
             self.systemShutdown()
             return
 
-        self.chatBox.addMessage(data.get("message"), "client")
-        self.emitToServer("message", data.get("message"))
+        self.chatBox.addMessage(data.get("message"), "client", pending=True)
+
+        # tag the message so its reply can be cancelled and stale events ignored
+        self.currentRequestId = uuid.uuid4().hex
+        self.textToSpeechThread.begin_audio_stream()
+        self.emitToServer(
+            "message", {"text": data.get("message"), "requestId": self.currentRequestId}
+        )
+
+    def acceptServerTranscript(self, data):
+        self.chatBox.addMessage(data.get("message"), "client", pending=True)
+        self.currentRequestId = data.get("requestId")
+        self.textToSpeechThread.begin_audio_stream()
+        self.setResponseGenerationActive(True)
+
+    def showTimings(self, timings):
+        """Per-stage server timings of the last reply, in milliseconds"""
+        text = "  ".join(f"{stage} {ms:.0f}ms" for stage, ms in timings.items())
+        print(f"Reply timings: {text}")
+        if SHOW_TIMINGS:
+            self.chatBox.addMessage(text, "info")
+
+    def isReplyActive(self):
+        return self.ResponseGenerationActive or self.textToSpeechThread.is_playing_audio()
+
+    def cancelCurrentRequest(self):
+        """Stop the current reply here and ask the server to stop working on it"""
+        if self.currentRequestId and serverConnected():
+            try:
+                sio.emit("cancel", {"requestId": self.currentRequestId})
+            except Exception as e:
+                print(f"Failed to cancel request: {str(e)}")
+
+        self.currentRequestId = None
+        self.textToSpeechThread.stop_playback()
+        self.chatBox.endStreamingMessage()
+        self.setResponseGenerationActive(False)
 
     def handleTts(self, eventName, data):
         if eventName == "error":
@@ -152,7 +387,7 @@ class mainWindow(QWidget):
         tries = 3
 
         while retry and tries > 0:
-            if sio.connected:
+            if serverConnected():
                 try:
                     self.setResponseGenerationActive(True)
                     sio.emit(eventName, message)
@@ -175,12 +410,16 @@ class mainWindow(QWidget):
                     self.setResponseGenerationActive(False)
                     reported = True
 
+    def setLastMessageId(self, messageId):
+        # sent on the next (re)connect so the server only sends newer messages
+        self.socketThread.auth["lastMessageId"] = messageId
+
     def setResponseGenerationActive(self, value: bool):
         self.ResponseGenerationActive = value
         if value:
             self.messageBox.updateText("Response is being generated ...")
         else:
-            self.messageBox.updateText(MESSAGE_PLACEHOLDER_TEXT)
+            self.messageBox.updateText(self.idleText())
 
     def systemShutdown(self):
         try:
@@ -232,7 +471,7 @@ class mainWindow(QWidget):
                 GPIO.cleanup()
 
             # Disconnect network
-            if sio.connected:
+            if serverConnected():
                 sio.disconnect()
 
         except Exception as e:
@@ -246,14 +485,28 @@ class mainWindow(QWidget):
 class SocketThread(QThread):
     socketSignal = pyqtSignal(str, object)
 
+    def __init__(self):
+        super().__init__()
+        # the server keeps a separate chat session for every device, the socketio client
+        # sends this same dict again on every reconnect
+        self.auth = {"token": "zelnaAuthentication", "device": deviceId(), "name": platform.node()}
+
     def run(self):
         port = "http://192.168.0.101:5000"
         retry_delay = 5  # seconds between retries
 
+        started = time.perf_counter()
+        sio = createSocketClient()
+        logStartupPhase("socketio imported", started)
+
         @sio.on("initialize")
         def handleInitialization(data):
             self.socketSignal.emit("initialize", data)
 
+        @sio.on("sync")
+        def handleSync(data):
+            self.socketSignal.emit("sync", data)
+
         @sio.on("disconnect")
         def handleDisconnection():
             self.socketSignal.emit(
@@ -261,6 +514,34 @@ class SocketThread(QThread):
                 {"message": "Disconnected from server", "sender": "info"},
             )
 
+        @sio.on("response_chunk")
+        def handleResponseChunk(data):
+            self.socketSignal.emit("response_chunk", data)
+
+        @sio.on("response_audio")
+        def handleResponseAudio(data):
+            self.socketSignal.emit("response_audio", data)
+
+        @sio.on("audio_chunk")
+        def handleAudioChunk(data):
+            self.socketSignal.emit("audio_chunk", data)
+
+        @sio.on("stt_result")
+        def handleSttResult(data):
+            self.socketSignal.emit("stt_result", data)
+
+        @sio.on("action")
+        def handleAction(data):
+            self.socketSignal.emit("action", data)
+
+        @sio.on("queue_status")
+        def handleQueueStatus(data):
+            self.socketSignal.emit("queue_status", data)
+
+        @sio.on("busy")
+        def handleBusy(data):
+            self.socketSignal.emit("busy", data)
+
         @sio.on("response")
         def handleMessage(data):
             self.socketSignal.emit("response", data)
@@ -271,9 +552,13 @@ class SocketThread(QThread):
                 sio.connect(
                     port,
                     transports=["websocket"],
-                    auth={"token": "zelnaAuthentication"},
+                    auth=self.auth,
                     retry=True,
                 )
+                if started is not None:
+                    logStartupPhase("connected to the server", started)
+                    started = None
+                self.socketSignal.emit("connected", None)
                 sio.wait()
 
             except Exception as e:
@@ -291,53 +576,34 @@ class GPIOThread(QThread):
     gpioSignal = pyqtSignal(str)
 
     def run(self):
+        """The buttons report from edge interrupts, the thread only sleeps in its event loop until quit()"""
+        buttons = ButtonInput(GPIO, debounce=BUTTON_DEBOUNCE)
         try:
-            # pins
-            powerPin = 26
-            powerPinPressed = False
-
-            upPin = 6
-            upPinPressed = False
-
-            downPin = 5
-            downPinPressed = False
-
             GPIO.setmode(GPIO.BCM)
-            GPIO.setup(powerPin, GPIO.IN, pull_up_down=GPIO.PUD_UP)
-            GPIO.setup(upPin, GPIO.IN, pull_up_down=GPIO.PUD_UP)
-            GPIO.setup(downPin, GPIO.IN, pull_up_down=GPIO.PUD_UP)
-
-            while True:
-                # Power Pin
-                if not GPIO.input(powerPin):
-                    if not powerPinPressed:
-                        self.gpioSignal.emit("powerButtonPressed")
-                        powerPinPressed = True
-                else:
-                    if powerPinPressed:
-                        self.gpioSignal.emit("powerButtonReleased")
-                    powerPinPressed = False
-
-                # up / down pin interrupts
-                if not GPIO.input(upPin):
-                    if not upPinPressed:
-                        self.gpioSignal.emit("upButton")
-                        upPinPressed = True
-                else:
-                    upPinPressed = False
-
-                if not GPIO.input(downPin):
-                    if not downPinPressed:
-                        self.gpioSignal.emit("downButton")
-                        downPinPressed = True
-                else:
-                    downPinPressed = False
-
-                time.sleep(0.05)
+            buttons.add(
+                POWER_PIN,
+                lambda: self.gpioSignal.emit("powerButtonPressed"),
+                lambda: self.gpioSignal.emit("powerButtonReleased"),
+            )
+            buttons.add(
+                UP_PIN,
+                lambda: self.gpioSignal.emit("upButton"),
+                repeatDelay=SCROLL_REPEAT_DELAY,
+                repeatInterval=SCROLL_REPEAT_INTERVAL,
+            )
+            buttons.add(
+                DOWN_PIN,
+                lambda: self.gpioSignal.emit("downButton"),
+                repeatDelay=SCROLL_REPEAT_DELAY,
+                repeatInterval=SCROLL_REPEAT_INTERVAL,
+            )
+            buttons.start()
+            self.exec_()
 
         except Exception as e:
-            self.gpioSignal.emit("message", {"message": f"An error occurred: {str(e)}"})
+            print(f"GPIO input failed: {str(e)}")
         finally:
+            buttons.stop()
             GPIO.cleanup()
 
 
@@ -347,111 +613,260 @@ class SpeechToTextThread(QThread):
     def __init__(self):
         super().__init__()
         self.queue = queue.Queue()
-        self.isListening = False
-        self.resetRequested = False
-        self.model = Model(model_name="vosk-model-small-en-us-0.15")
-        self.samplerate = None
+        self.listening = threading.Event()  # set while the power button is held
+        self.model = None  # loaded by run, off the GUI thread
+        self.ready = False  # model loaded and microphone open
+        self.samplerate = None  # rate of the frames in the queue, RECOGNIZER_SAMPLERATE
+        self.captureRate = None
+        self.resampler = None  # only when the microphone can't capture at RECOGNIZER_SAMPLERATE
+        self.vad = None  # with VAD_ENABLED or HANDS_FREE, created by run
+        self.muteWhile = lambda: False  # frames are dropped while this is true, set by mainWindow
+        self.rec = None
 
         self.prevPartialText = ""
         self.finalText = ""
         self.lastWord = ""
 
+    @property
+    def isListening(self):
+        return self.listening.is_set()
+
+    @isListening.setter
+    def isListening(self, value):
+        if value:
+            self.listening.set()
+        else:
+            self.listening.clear()
+            self.queue.put(None)  # wake the loop so the utterance is finished right away
+
     def callback(self, indata, frames, time, status):
-        if self.isListening:
-            self.queue.put(bytes(indata))
+        if self.listening.is_set():
+            data = bytes(indata)
+            if self.resampler is not None:
+                data = self.resampler.process(data)
+            self.queue.put(data)
+
+    def loadModel(self):
+        """Import numpy and vosk and load the model here, off the GUI thread"""
+        started = time.perf_counter()
+        from audioResampler import RECOGNIZER_SAMPLERATE
+        from voiceActivity import VoiceActivityDetector
+
+        self.samplerate = RECOGNIZER_SAMPLERATE
+        if VAD_ENABLED or HANDS_FREE:
+            self.vad = VoiceActivityDetector(self.samplerate, VAD_TRAILING_SILENCE)
+
+        # with SERVER_STT the small on-device model is not needed
+        if not SERVER_STT:
+            from vosk import Model
+
+            self.model = Model(model_name="vosk-model-small-en-us-0.15")
+        logStartupPhase("speech model loaded", started)
+
+    def setReady(self):
+        self.ready = True
+        self.sttSignal.emit("ready", None)
+        logStartupPhase("speech recognition ready")
+
+    def openInputStream(self):
+        """Capture at RECOGNIZER_SAMPLERATE, or at the device rate and resample in the callback"""
+        import sounddevice
+        from audioResampler import RECOGNIZER_SAMPLERATE, PolyphaseResampler, choose_capture_rate
+
+        self.captureRate = choose_capture_rate(sounddevice)
+        if self.captureRate != RECOGNIZER_SAMPLERATE:
+            self.resampler = PolyphaseResampler(self.captureRate, RECOGNIZER_SAMPLERATE)
+        print(f"Microphone captured at {self.captureRate} Hz, recognized at {self.samplerate} Hz")
+
+        return sounddevice.RawInputStream(
+            samplerate=self.captureRate,
+            blocksize=2048,
+            device=None,
+            dtype="int16",
+            channels=1,
+            callback=self.callback,
+        )
+
+    def utteranceFrames(self):
+        """Frames of the current utterance, blocking while none arrive; ends once the button is released
+        and every captured frame has been handed out"""
+        while self.listening.is_set() or not self.queue.empty():
+            try:
+                data = self.queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            if data is not None:
+                yield data
+
+    def speechFrames(self):
+        """Frames of the current utterance that contain speech. With the VAD the utterance also ends after
+        VAD_TRAILING_SILENCE of silence following speech; push-to-talk then ignores the rest of the press"""
+        if self.vad is None:
+            yield from self.utteranceFrames()
+            return
+
+        self.vad.reset()
+        for data in self.utteranceFrames():
+            if HANDS_FREE and self.muteWhile():
+                self.vad.reset()
+                continue
+
+            frames, ended = self.vad.process(data)
+            yield from frames
+            if ended:
+                if not HANDS_FREE:
+                    self.isListening = False
+                return
 
     def run(self):
         try:
-            device_info = sounddevice.query_devices(None, "input")
-            self.samplerate = int(device_info["default_samplerate"])
-
-            with sounddevice.RawInputStream(
-                samplerate=self.samplerate,
-                blocksize=2048,
-                device=None,
-                dtype="int16",
-                channels=1,
-                callback=self.callback,
-            ):
-                self.rec = KaldiRecognizer(self.model, self.samplerate)
+            self.loadModel()
+        except Exception as e:
+            self.sttSignal.emit("message", {"message": f"An error occurred: {str(e)}"})
+            return
+
+        if SERVER_STT:
+            self.runServerRecognition()
+            return
+
+        try:
+            with self.openInputStream():
+                self.resetProperties()
+                self.setReady()
 
                 while True:
-                    if self.resetRequested:
-                        self.resetProperties()
-                        self.resetRequested = False
-
-                    if self.isListening:
-                        if not self.queue.empty():
-                            data = self.queue.get()
-
-                            if self.rec.AcceptWaveform(data):
-                                result = json.loads(self.rec.Result())
-                                finalText = result.get("text", "").strip()
-
-                                if finalText:
-                                    if self.finalText and not self.finalText.endswith(
-                                        " "
-                                    ):
-                                        self.finalText += " "
-                                    self.finalText += finalText
-                                    self.prevPartialText = ""
-                                    self.lastWord = (
-                                        finalText.split()[-1] if finalText else ""
-                                    )
-
-                            else:
-                                partialResult = (
-                                    json.loads(self.rec.PartialResult())
-                                    .get("partial", "")
-                                    .strip()
-                                )
-
-                                if partialResult != self.prevPartialText:
-                                    combinedText = self.finalText
-                                    if self.finalText and (
-                                        partialResult
-                                        and not partialResult.startswith(self.lastWord)
-                                    ):
-                                        combinedText += " "
-                                    combinedText += partialResult
-
-                                    self.sttSignal.emit(
-                                        "partialResult",
-                                        {"message": combinedText.strip()},
-                                    )
-                                    self.prevPartialText = partialResult
-
-                    else:
-                        if self.finalText and not self.resetRequested:
-                            self.sttSignal.emit(
-                                "finalResult", {"message": self.finalText.strip()}
-                            )
-
-                        # Ensure partial text on screen is cleared even if no final text
-                        self.sttSignal.emit(
-                            "partialResult", {"message": MESSAGE_PLACEHOLDER_TEXT}
-                        )
+                    # sleeps until the button is pressed, nothing runs while idle
+                    self.listening.wait()
+
+                    for data in self.speechFrames():
+                        self.recognize(data)
+                    self.finishUtterance()
 
-                        if not self.resetRequested:
-                            self.requestReset()
+                    if self.finalText:
+                        self.sttSignal.emit("finalResult", {"message": self.finalText.strip()})
+
+                    # Ensure partial text on screen is cleared even if no final text
+                    self.sttSignal.emit("partialResult", {"message": MESSAGE_PLACEHOLDER_TEXT})
+                    self.resetProperties()
 
         except Exception as e:
             self.sttSignal.emit("message", {"message": f"An error occurred: {str(e)}"})
 
+    def recognize(self, data):
+        if self.rec.AcceptWaveform(data):
+            self.appendFinalText(json.loads(self.rec.Result()).get("text", ""))
+
+        else:
+            partialResult = json.loads(self.rec.PartialResult()).get("partial", "").strip()
+
+            if partialResult != self.prevPartialText:
+                combinedText = self.finalText
+                if self.finalText and (partialResult and not partialResult.startswith(self.lastWord)):
+                    combinedText += " "
+                combinedText += partialResult
+
+                self.sttSignal.emit("partialResult", {"message": combinedText.strip()})
+                self.prevPartialText = partialResult
+
+    def appendFinalText(self, text):
+        finalText = text.strip()
+        if finalText:
+            if self.finalText and not self.finalText.endswith(" "):
+                self.finalText += " "
+            self.finalText += finalText
+            self.prevPartialText = ""
+            self.lastWord = finalText.split()[-1]
+
+    def finishUtterance(self):
+        """Flush the words the recognizer hasn't finalized yet, the VAD cuts the trailing silence it would wait for"""
+        self.appendFinalText(json.loads(self.rec.FinalResult()).get("text", ""))
+        if self.vad is not None and self.vad.heardSpeech:
+            print(f"VAD passed {self.vad.passedSeconds:.1f}s, dropped {self.vad.droppedSeconds:.1f}s of silence")
+
+    def runServerRecognition(self):
+        """Send the microphone frames to the server while listening, results come back as "stt_result" events"""
+        try:
+            with self.openInputStream():
+                self.setReady()
+                while True:
+                    self.listening.wait()
+                    try:
+                        self.streamUtterance()
+                    except Exception as e:
+                        self.sttSignal.emit("message", {"message": f"Speech recognition failed: {str(e)}"})
+                        if not HANDS_FREE:
+                            self.isListening = False  # the rest of this press is dropped, the next one starts over
+
+        except Exception as e:
+            self.sttSignal.emit("message", {"message": f"An error occurred: {str(e)}"})
+
+    def streamUtterance(self):
+        """Stream one utterance to the server. If the connection drops the utterance is given up but its
+        frames are still consumed, so the next press starts clean"""
+        streamId = None
+        accepted = False
+        seq = 0
+        for data in self.speechFrames():
+            if streamId is None:
+                # opened on the first speech, frames wait in the queue meanwhile
+                streamId = uuid.uuid4().hex
+                accepted = self.startServerStream(streamId)
+            if not accepted:
+                continue
+            if not serverConnected():
+                self.sttSignal.emit("message", {"message": "Lost the connection to the server"})
+                accepted = False
+                continue
+            try:
+                sio.emit("stt_audio", {"streamId": streamId, "seq": seq, "data": data})
+            except Exception as e:
+                self.sttSignal.emit("message", {"message": f"Speech recognition failed: {str(e)}"})
+                accepted = False
+                continue
+            seq += 1
+
+        if accepted:
+            if not serverConnected():
+                self.sttSignal.emit("message", {"message": "Lost the connection to the server"})
+                return
+            try:
+                sio.emit("stt_end", {"streamId": streamId, "frames": seq})
+            except Exception as e:
+                self.sttSignal.emit("message", {"message": f"Speech recognition failed: {str(e)}"})
+
+    def startServerStream(self, streamId):
+        """Open a recognition stream on the server, frames are only sent once it has accepted it"""
+        if not serverConnected():
+            self.sttSignal.emit("message", {"message": "Not connected to the server"})
+            return False
+        try:
+            answer = sio.call(
+                "stt_start",
+                {"streamId": streamId, "requestId": uuid.uuid4().hex, "samplerate": self.samplerate},
+                timeout=5,
+            )
+        except Exception as e:
+            self.sttSignal.emit("message", {"message": f"Speech recognition failed: {str(e)}"})
+            return False
+
+        if answer and answer.get("error"):
+            self.sttSignal.emit("message", {"message": answer.get("error")})
+            return False
+        return True
+
     def resetProperties(self):
         while not self.queue.empty():
             try:
                 self.queue.get_nowait()
             except queue.Empty:
                 break
+        from vosk import KaldiRecognizer
+
         self.rec = KaldiRecognizer(self.model, self.samplerate)
         self.prevPartialText = ""
         self.finalText = ""
         self.lastWord = ""
 
-    def requestReset(self):
-        self.resetRequested = True
-
 
 class TextToSpeechThread(QThread):
     ttsSignal = pyqtSignal(str, object)
@@ -472,6 +887,15 @@ class TextToSpeechThread(QThread):
         self.is_playing = False
         self.audio_file = os.path.join(os.getcwd(), "qtApp/current_audio.mp3")
 
+        # Audio segments of a streamed reply, played back to back by one mpg123 process
+        self.segments = queue.Queue()
+        self.stream_open = False  # segments of a reply are still arriving
+        self.discard_stream = False  # playback was stopped, drop the rest of the reply
+        self.expected_seq = 0  # next binary audio chunk of the reply
+        self.pcm_stream = None
+        self.pcm_generation = 0
+        self.playback_generation = 0  # bumped on every stop so the writer drops what it is playing
+
     def _check_mpg123_installed(self):
         """Check if mpg123 is available in system PATH"""
         try:
@@ -486,8 +910,151 @@ class TextToSpeechThread(QThread):
         except:
             return False
 
-    def play_audio(self, base64_audio):
+    def run(self):
+        """Write queued audio segments into one player so a reply plays without gaps"""
+        while True:
+            segment = self.segments.get()
+
+            if segment is None:  # end of the current reply
+                self._close_stream()
+                continue
+
+            audio, audioFormat = segment
+            try:
+                if audioFormat.get("format") == "pcm":
+                    self._write_pcm(audio, audioFormat)
+                else:
+                    process = self._open_stream()
+                    process.stdin.write(audio)
+                    process.stdin.flush()
+            except (BrokenPipeError, OSError, ValueError):
+                pass  # playback was stopped while writing
+            except Exception as e:
+                self.ttsSignal.emit("error", {"message": f"Playback failed: {str(e)}"})
+
+    def _write_pcm(self, audio, audioFormat):
+        """Play raw 16-bit pcm through a sounddevice output stream, in small blocks so it can be stopped"""
+        import sounddevice
+
+        with self.lock:
+            generation = self.playback_generation
+            if self.pcm_stream is None:
+                self.pcm_stream = sounddevice.RawOutputStream(
+                    samplerate=audioFormat.get("samplerate"),
+                    channels=audioFormat.get("channels", 1),
+                    dtype="int16",
+                )
+                self.pcm_stream.start()
+                self.pcm_generation = generation
+            stream = self.pcm_stream
+
+        for start in range(0, len(audio), PCM_WRITE_BLOCK_BYTES):
+            if generation != self.playback_generation:
+                return
+            stream.write(audio[start : start + PCM_WRITE_BLOCK_BYTES])
+
+    def _open_stream(self):
+        """Return the mpg123 process of the current reply, starting it if needed"""
+        with self.lock:
+            process = self.current_process
+
+        # Let the previous reply finish playing before the next one starts
+        if process and (process.stdin is None or process.stdin.closed):
+            process.wait()
+
+        with self.lock:
+            if self.current_process is None:
+                self.current_process = subprocess.Popen(
+                    ["mpg123", "-q", "-"],
+                    stdin=subprocess.PIPE,
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.DEVNULL,
+                )
+                self.is_playing = True
+                threading.Thread(
+                    target=self._monitor_playback,
+                    args=(self.current_process,),
+                    daemon=True,
+                ).start()
+            return self.current_process
+
+    def _close_stream(self):
+        """Let the player finish what it already received, or drop it if playback was stopped"""
+        with self.lock:
+            process = self.current_process
+            stream = self.pcm_stream
+            stopped = self.pcm_generation != self.playback_generation
+            self.pcm_stream = None
+
+        if process and process.stdin:
+            try:
+                process.stdin.close()
+            except OSError:
+                pass
+
+        if stream:
+            try:
+                if stopped:
+                    stream.abort()
+                else:
+                    stream.stop()  # blocks until the queued audio has been played
+                stream.close()
+            except Exception:
+                pass
+            with self.lock:
+                if self.current_process is None and self.segments.empty():
+                    self.is_playing = False
+
+    def queue_audio(self, base64_audio, audioFormat=None):
+        """Queue one base64 audio segment of the reply currently being streamed"""
+        self._queue_segment(base64.b64decode(base64_audio), audioFormat)
+
+    def queue_audio_chunk(self, chunk):
+        """Queue one binary audio chunk, the chunk marked final ends the reply"""
+        seq = chunk.get("seq", 0)
+        if seq != self.expected_seq:
+            print(f"Audio chunk {seq} arrived, expected {self.expected_seq}")
+        self.expected_seq = seq + 1
+
+        if chunk.get("data"):
+            self._queue_segment(chunk.get("data"), chunk)
+        if chunk.get("final"):
+            self.expected_seq = 0
+            self.end_audio_stream()
+
+    def _queue_segment(self, audio, audioFormat):
+        with self.lock:
+            self.stream_open = True
+            if self.discard_stream:
+                return
+            self.is_playing = True
+        self.segments.put((audio, audioFormat or {"format": "mp3"}))
+
+    def begin_audio_stream(self):
+        """Forget the state of a previous, possibly cancelled, reply before a new one starts"""
+        with self.lock:
+            self.stream_open = False
+            self.discard_stream = False
+            self.expected_seq = 0
+
+    def end_audio_stream(self):
+        """Mark the end of the streamed reply"""
+        with self.lock:
+            discarded = self.discard_stream
+            self.stream_open = False
+            self.discard_stream = False
+        if not discarded:
+            self.segments.put(None)
+
+    def play_audio(self, base64_audio, audioFormat=None):
         """Play audio using file in working directory"""
+        if audioFormat and audioFormat.get("format") == "pcm":
+            # raw pcm goes straight to the output stream, no file needed
+            self.stop_playback()
+            self.queue_audio(base64_audio, audioFormat)
+            self.end_audio_stream()
+            return
+
         with self.lock:
             self._stop_playback()
 
@@ -505,25 +1072,42 @@ class TextToSpeechThread(QThread):
                 )
 
                 # Monitor playback completion
-                threading.Thread(target=self._monitor_playback, daemon=True).start()
+                threading.Thread(
+                    target=self._monitor_playback,
+                    args=(self.current_process,),
+                    daemon=True,
+                ).start()
 
             except Exception as e:
                 self.is_playing = False
                 self.ttsSignal.emit("error", {"message": f"Playback failed: {str(e)}"})
                 self._cleanup_file()
 
-    def _monitor_playback(self):
+    def _monitor_playback(self, process):
         """Wait for playback completion and clean up"""
         try:
-            if self.current_process:
-                self.current_process.wait(timeout=1800)  # 30 minute max
+            process.wait(timeout=1800)  # 30 minute max
         finally:
             with self.lock:
-                self.is_playing = False
+                if self.current_process is process:
+                    self.current_process = None
+                    self.is_playing = False
             self._cleanup_file()
 
     def _stop_playback(self):
         """Force stop current playback"""
+        # Drop queued segments, and the ones still on their way from the server
+        self.discard_stream = self.stream_open
+        self.playback_generation += 1
+        while not self.segments.empty():
+            try:
+                self.segments.get_nowait()
+            except queue.Empty:
+                break
+        if self.pcm_stream is not None:
+            self.segments.put(None)  # wake the writer so it closes the pcm stream
+        self.is_playing = False
+
         if self.current_process:
             try:
                 self.current_process.terminate()
@@ -558,8 +1142,12 @@ class TextToSpeechThread(QThread):
 
 
 if __name__ == "__main__":
+    logStartupPhase("imports done")
     app = QApplication(sys.argv)
     window = mainWindow()
     window.show()
+    app.processEvents()  # paint the first frame before the threads start loading
+    logStartupPhase("window shown")
+    window.startThreads()
 
     sys.exit(app.exec_())
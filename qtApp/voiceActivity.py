@@ -0,0 +1,86 @@
+"""Voice activity detection on microphone blocks, so silence never reaches the recognizer."""
+from collections import deque
+import numpy as np
+
+MIN_ENERGY = 300  # RMS below this is silence however quiet the room is
+ENERGY_RATIO = 3.0  # speech is this much louder than the noise floor
+MAX_ZERO_CROSSING_RATE = 0.35  # crossings per sample, hiss and fan noise are above, voiced speech below
+NOISE_ADAPTATION = 0.05  # how quickly the noise floor follows silent blocks
+
+
+def block_features(data):
+    """RMS energy and zero-crossing rate of a block of int16 bytes."""
+    samples = np.frombuffer(data, dtype=np.int16).astype(np.float32)
+    if len(samples) < 2:
+        return 0.0, 0.0
+    energy = float(np.sqrt(np.mean(samples * samples)))
+    crossings = np.count_nonzero(np.signbit(samples[1:]) != np.signbit(samples[:-1]))
+    return energy, crossings / (len(samples) - 1)
+
+
+class VoiceActivityDetector:
+    """Decide per block whether it goes to the recognizer, and when an utterance is over.
+
+    A block is speech if it is well above the noise floor and has a speech-like zero-crossing rate;
+    blocks loud enough to be unmistakable count regardless, which keeps fricatives. Silence before
+    the speech is dropped except for the last preRoll seconds, which are passed on with the first
+    speech block so the onset of a word isn't clipped. After speech, hangover seconds of silence are
+    still passed on and the rest is dropped; trailingSilence seconds of it end the utterance.
+    The noise floor is learned from silent blocks and kept across utterances.
+    """
+
+    def __init__(self, samplerate, trailingSilence=0.8, hangover=0.3, preRoll=0.3):
+        self.samplerate = samplerate
+        self.trailingSilence = trailingSilence
+        self.hangover = hangover
+        self.preRoll = preRoll
+        self.noiseFloor = MIN_ENERGY / ENERGY_RATIO
+        self.reset()
+
+    def reset(self):
+        """Start a new utterance."""
+        self.heardSpeech = False
+        self.silence = 0.0  # seconds of silence since the last speech block
+        self.pending = deque()  # silent blocks kept for the pre-roll
+        self.pendingSeconds = 0.0
+        self.droppedSeconds = 0.0
+        self.passedSeconds = 0.0
+
+    def is_speech(self, data):
+        energy, zeroCrossingRate = block_features(data)
+        threshold = max(MIN_ENERGY, self.noiseFloor * ENERGY_RATIO)
+        speech = energy > threshold and (zeroCrossingRate < MAX_ZERO_CROSSING_RATE or energy > 2 * threshold)
+        if not speech:
+            self.noiseFloor += NOISE_ADAPTATION * (energy - self.noiseFloor)
+        return speech
+
+    def process(self, data):
+        """Returns (blocks for the recognizer, whether the utterance has ended)."""
+        seconds = len(data) / 2 / self.samplerate
+
+        if self.is_speech(data):
+            blocks = list(self.pending) + [data]
+            self.passedSeconds += self.pendingSeconds + seconds
+            self.pending.clear()
+            self.pendingSeconds = 0.0
+            self.heardSpeech = True
+            self.silence = 0.0
+            return blocks, False
+
+        if not self.heardSpeech:
+            # leading silence, keep just enough of it for the pre-roll
+            self.pending.append(data)
+            self.pendingSeconds += seconds
+            while self.pending and self.pendingSeconds - len(self.pending[0]) / 2 / self.samplerate >= self.preRoll:
+                dropped = len(self.pending.popleft()) / 2 / self.samplerate
+                self.pendingSeconds -= dropped
+                self.droppedSeconds += dropped
+            return [], False
+
+        self.silence += seconds
+        ended = self.silence >= self.trailingSilence
+        if self.silence - seconds < self.hangover:
+            self.passedSeconds += seconds
+            return [data], ended
+        self.droppedSeconds += seconds
+        return [], ended
@@ -19,6 +19,8 @@ class ChatBox(QScrollArea):
         self.lightmode = lightmode
         self.ui = UI(lightmode=self.lightmode)
         self.scrollAnimation = None
+        self.streamingMessage = None  # bubble of the reply that is currently being streamed
+        self.pendingMessages = []  # bubbles shown before the server acknowledged storing them
 
         self.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
         self.setVerticalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
@@ -41,16 +43,48 @@ class ChatBox(QScrollArea):
             QSpacerItem(1, 1, QSizePolicy.Preferred, QSizePolicy.MinimumExpanding)
         )
 
-    def addMessage(self, text="", sender="info"):
+    def addMessage(self, text="", sender="info", pending=False):
         if (text == "") or (sender not in ["info", "client", "server"]):
             return
 
         newMessage = TextBubbleWidget(text, sender, lightmode=self.lightmode)
         self.layout.insertWidget(self.layout.count() - 1, newMessage)  # Add above spacer
+        if pending:
+            self.pendingMessages.append(newMessage)
 
         # Ensure scroll stays at the bottom after adding a new message
         QTimer.singleShot(0, self.scrollToBottom)
 
+    def appendStreamingMessage(self, text="", sender="server"):
+        """Grow the bubble of the reply that is currently being streamed."""
+        if (text == "") or (sender not in ["info", "client", "server"]):
+            return
+
+        if self.streamingMessage is None or self.streamingMessage.senderType != sender:
+            self.streamingMessage = TextBubbleWidget(text, sender, lightmode=self.lightmode)
+            self.layout.insertWidget(self.layout.count() - 1, self.streamingMessage)
+            self.pendingMessages.append(self.streamingMessage)
+        else:
+            self.streamingMessage.appendText(text)
+
+        QTimer.singleShot(0, lambda: self.scrollToBottom(duration=100))
+
+    def finishStreamingMessage(self, text="", sender="server"):
+        """Replace the streamed bubble with the final text, or add a new bubble if nothing was streamed."""
+        streamingMessage = self.streamingMessage
+        self.streamingMessage = None
+
+        if streamingMessage is not None and streamingMessage.senderType == sender and text != "":
+            streamingMessage.setText(text)
+            QTimer.singleShot(0, self.scrollToBottom)
+            return
+
+        self.addMessage(text, sender)
+
+    def endStreamingMessage(self):
+        """Keep the streamed bubble as it is, the next reply gets a new one."""
+        self.streamingMessage = None
+
     def initMessages(self, dataset):
         for i in dataset:
             newMessage = TextBubbleWidget(
@@ -59,7 +93,22 @@ class ChatBox(QScrollArea):
             self.layout.insertWidget(self.layout.count() - 1, newMessage)
             QTimer.singleShot(0, self.scrollToBottom)
 
+    def confirmMessages(self):
+        """The server stored everything shown so far, keep the pending bubbles."""
+        self.pendingMessages = []
+
+    def syncMessages(self, dataset):
+        """Replace the pending bubbles with the messages the server stored while they were pending."""
+        self.streamingMessage = None
+        for widget in self.pendingMessages:
+            self.layout.removeWidget(widget)
+            widget.deleteLater()
+        self.pendingMessages = []
+        self.initMessages(dataset)
+
     def clearMessages(self):
+        self.streamingMessage = None
+        self.pendingMessages = []
         while self.layout.count() > 1:  # Keep spacer intact
             widget = self.layout.takeAt(0).widget()
             if widget:
@@ -124,6 +173,7 @@ class TextBubbleWidget(QWidget):
     def __init__(self, text, sender="client", lightmode=False):
         super().__init__()
         self.lightmode = lightmode
+        self.senderType = sender
         self.ui = UI(self.lightmode)
 
         hbox = QHBoxLayout()
@@ -136,6 +186,7 @@ class TextBubbleWidget(QWidget):
             else self.ui.informationBubble
         )
         bubble = TextBubble(text, bubbleColor, self.lightmode)
+        self.bubble = bubble
 
         if sender == "client":
             hbox.addStretch()
@@ -151,3 +202,10 @@ class TextBubbleWidget(QWidget):
         self.setLayout(hbox)
         self.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Fixed)
         self.adjustSize()
+
+    def setText(self, text):
+        self.bubble.setText(text)
+        self.adjustSize()
+
+    def appendText(self, text):
+        self.setText(self.bubble.text() + text)
@@ -0,0 +1,143 @@
+import hashlib, json, os, threading
+from collections import OrderedDict
+
+
+def normalize_text(text):
+    """Collapse whitespace so the same sentence always maps to the same key."""
+    return " ".join(text.split())
+
+
+class AudioCache:
+    """Content-addressed cache of synthesized speech with an in-memory LRU tier and an on-disk tier.
+
+    Entries are keyed by a hash of (normalized text, voice id, rate, format). Both tiers are bounded
+    in bytes and evict the least recently used entries first.
+    """
+
+    def __init__(self, directory, memoryBytes=8 * 1024 * 1024, diskBytes=128 * 1024 * 1024):
+        self.directory = directory
+        self.memoryBytes = memoryBytes
+        self.diskBytes = diskBytes
+        self.lock = threading.Lock()
+
+        self.memory = OrderedDict()  # key -> (audio bytes, format info)
+        self.memorySize = 0
+        self.disk = OrderedDict()  # key -> file size, least recently used first
+        self.diskSize = 0
+
+        self.hits = 0
+        self.diskHits = 0
+        self.misses = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self._scan_disk()
+
+    @staticmethod
+    def make_key(text, voiceId, rate, audioFormat):
+        data = json.dumps([normalize_text(text), voiceId, rate, audioFormat], ensure_ascii=False)
+        return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """Return (audio bytes, format info) or None."""
+        with self.lock:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                self.hits += 1
+                return self.memory[key]
+            onDisk = key in self.disk
+
+        entry = self._read_disk(key) if onDisk else None
+        with self.lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.diskHits += 1
+            if key in self.disk:
+                self.disk.move_to_end(key)
+            self._put_memory(key, entry)
+            return entry
+
+    def put(self, key, audio, audioFormat):
+        with self.lock:
+            self._put_memory(key, (audio, audioFormat))
+        self._write_disk(key, audio, audioFormat)
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.diskHits + self.misses
+            return {
+                "hits": self.hits,
+                "diskHits": self.diskHits,
+                "misses": self.misses,
+                "hitRate": (self.hits + self.diskHits) / lookups if lookups else 0.0,
+                "memoryBytes": self.memorySize,
+                "diskBytes": self.diskSize,
+                "entries": len(self.disk),
+            }
+
+    def _put_memory(self, key, entry):
+        """Insert into the memory tier and evict, must be called with the lock held."""
+        if key in self.memory:
+            self.memorySize -= len(self.memory.pop(key)[0])
+        if len(entry[0]) > self.memoryBytes:
+            return
+        self.memory[key] = entry
+        self.memorySize += len(entry[0])
+        while self.memorySize > self.memoryBytes:
+            _, (audio, _) = self.memory.popitem(last=False)
+            self.memorySize -= len(audio)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.audio")
+
+    def _scan_disk(self):
+        """Index the files left by earlier runs, oldest first."""
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".audio"):
+                stat = os.stat(os.path.join(self.directory, name))
+                entries.append((stat.st_mtime, name[: -len(".audio")], stat.st_size))
+        for _, key, size in sorted(entries):
+            self.disk[key] = size
+            self.diskSize += size
+
+    def _read_disk(self, key):
+        # A cache file is one line of json format info followed by the audio bytes
+        try:
+            with open(self._path(key), "rb") as file:
+                header = file.readline()
+                audio = file.read()
+            return audio, json.loads(header)
+        except (OSError, ValueError):
+            with self.lock:
+                self.diskSize -= self.disk.pop(key, 0)
+            return None
+
+    def _write_disk(self, key, audio, audioFormat):
+        data = json.dumps(audioFormat).encode("utf-8") + b"\n" + audio
+        if len(data) > self.diskBytes:
+            return
+        path = self._path(key)
+        try:
+            with open(path + ".tmp", "wb") as file:
+                file.write(data)
+            os.replace(path + ".tmp", path)
+        except OSError as e:
+            print(f"Could not write audio cache entry: {e}")
+            return
+
+        evicted = []
+        with self.lock:
+            self.diskSize -= self.disk.pop(key, 0)
+            self.disk[key] = len(data)
+            self.diskSize += len(data)
+            while self.diskSize > self.diskBytes:
+                oldKey, size = self.disk.popitem(last=False)
+                self.diskSize -= size
+                evicted.append(oldKey)
+
+        for oldKey in evicted:
+            try:
+                os.remove(self._path(oldKey))
+            except OSError:
+                pass
@@ -0,0 +1,54 @@
+import wave
+
+try:
+    import lameenc  # mp3 encoder linked into the process, no ffmpeg spawn per segment
+except ImportError:
+    lameenc = None
+
+lameencMissing = False  # warned once that lameenc is not installed
+
+
+def read_wav_pcm(wav_path):
+    """Read a 16-bit wav file and return its raw pcm frames with the sample rate and channel count."""
+    with wave.open(wav_path, "rb") as wav:
+        if wav.getsampwidth() != 2:
+            raise ValueError(f"Expected 16-bit samples, got {wav.getsampwidth() * 8}-bit")
+        return wav.readframes(wav.getnframes()), wav.getframerate(), wav.getnchannels()
+
+
+def pcm_to_mp3(pcm, samplerate, channels, bitrate="32k"):
+    """Encode raw 16-bit pcm to constant bitrate mp3 in-process.
+
+    An encoder can not be reused after its flush, but creating one is cheap. The output has no tags,
+    so segments can be played back to back.
+    """
+    encoder = lameenc.Encoder()
+    encoder.set_bit_rate(int(bitrate.rstrip("k")))
+    encoder.set_in_sample_rate(samplerate)
+    encoder.set_channels(channels)
+    encoder.set_quality(2)
+    return bytes(encoder.encode(pcm) + encoder.flush())
+
+
+def pcm_format(samplerate, channels):
+    return {"format": "pcm", "samplerate": samplerate, "channels": channels}
+
+
+def encode_wav_file(wav_path, audioFormat="mp3", bitrate="32k"):
+    """Turn the wav written by the TTS engine into (audio bytes, format info) for the client.
+
+    Falls back to pcm if lameenc is not installed.
+    """
+    pcm, samplerate, channels = read_wav_pcm(wav_path)
+    if audioFormat == "mp3":
+        if lameenc is not None:
+            return pcm_to_mp3(pcm, samplerate, channels, bitrate), {"format": "mp3"}
+        warn_lameenc_missing()
+    return pcm, pcm_format(samplerate, channels)
+
+
+def warn_lameenc_missing():
+    global lameencMissing
+    if not lameencMissing:
+        lameencMissing = True
+        print("lameenc not found, sending pcm instead of mp3")
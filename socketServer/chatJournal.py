@@ -0,0 +1,134 @@
+import json, os, threading
+
+
+class ChatJournal:
+    """Append-only JSONL chat history with periodic compaction.
+
+    Every message is one appended line, so a write costs the same however long the history is,
+    and a crash can at most lose the line that was being written. The file is rewritten
+    atomically once most of its lines are no longer part of the live history.
+
+    Clearing writes a {"_op": "clear", ...} record; the latest one is kept through compaction and
+    is available as lastClear so callers can store data about the clear in it.
+    """
+
+    def __init__(self, path, legacyPath=None, compactRatio=2.0, minCompactLines=200, fsync=True):
+        self.path = path
+        self.legacyPath = legacyPath
+        self.compactRatio = compactRatio
+        self.minCompactLines = minCompactLines
+        self.fsync = fsync
+        self.lines = 0  # lines in the file, live or not
+        self.lastClear = None
+        self.file = None
+        self.lock = threading.Lock()
+
+    def load(self):
+        """Return the messages in the journal, importing the legacy json history on first use."""
+        with self.lock:
+            if not os.path.exists(self.path) and self.legacyPath and os.path.exists(self.legacyPath):
+                self._migrate()
+
+            messages = []
+            self.lines = 0
+            goodBytes = 0
+            if os.path.exists(self.path):
+                with open(self.path, "rb") as file:
+                    lines = file.readlines()
+                for number, line in enumerate(lines, 1):
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        if number == len(lines):
+                            print(f"Ignoring torn record at the end of {self.path}")
+                            break
+                        # damaged in the middle, the records after it are still good
+                        print(f"Skipping unreadable record on line {number} of {self.path}")
+                        goodBytes += len(line)
+                        self.lines += 1
+                        continue
+                    goodBytes += len(line)
+                    self.lines += 1
+                    if record.get("_op") == "clear":
+                        messages = []
+                        self.lastClear = record
+                    else:
+                        messages.append(record)
+
+                # Cut off a torn last line so the next append starts on a fresh line
+                with open(self.path, "r+b") as file:
+                    file.truncate(goodBytes)
+                    if goodBytes:
+                        file.seek(goodBytes - 1)
+                        if file.read(1) != b"\n":
+                            file.write(b"\n")
+
+            print(f"Loaded {len(messages)} messages from {self.path}")
+            return messages
+
+    def append(self, message):
+        self._write_line(message)
+
+    def clear(self, **meta):
+        """Drop the whole history, meta is stored in the clear record."""
+        record = {"_op": "clear", **meta}
+        self._write_line(record)
+        self.lastClear = record
+        self.compact([])
+
+    def maybe_compact(self, messages):
+        """Rewrite the journal when it holds many more lines than the live history."""
+        if self.lines > max(self.minCompactLines, len(messages) * self.compactRatio):
+            self.compact(messages)
+
+    def compact(self, messages):
+        """Atomically replace the journal with exactly the given messages."""
+        with self.lock:
+            self._close()
+            tempPath = self.path + ".tmp"
+            records = ([self.lastClear] if self.lastClear else []) + list(messages)
+            with open(tempPath, "w", encoding="utf-8") as file:
+                for record in records:
+                    file.write(json.dumps(record, ensure_ascii=False) + "\n")
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(tempPath, self.path)
+            self.lines = len(records)
+
+    def close(self):
+        with self.lock:
+            self._close()
+
+    def _write_line(self, record):
+        with self.lock:
+            if self.file is None:
+                self.file = open(self.path, "a", encoding="utf-8")
+            self.file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self.file.flush()
+            if self.fsync:
+                os.fsync(self.file.fileno())
+            self.lines += 1
+
+    def _close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def _migrate(self):
+        """Import a chat_history.json written before the journal existed, must hold the lock."""
+        try:
+            with open(self.legacyPath, "r") as file:
+                messages = json.load(file) if os.path.getsize(self.legacyPath) else []
+        except (OSError, ValueError) as e:
+            print(f"Could not import {self.legacyPath}: {e}")
+            return
+
+        tempPath = self.path + ".tmp"
+        with open(tempPath, "w", encoding="utf-8") as file:
+            for message in messages:
+                file.write(json.dumps(message, ensure_ascii=False) + "\n")
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tempPath, self.path)
+        os.replace(self.legacyPath, self.legacyPath + ".migrated")
+        print(f"Imported {len(messages)} messages from {self.legacyPath}")
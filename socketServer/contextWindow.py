@@ -0,0 +1,182 @@
+import threading
+
+
+def estimate_tokens(text):
+    """Cheap token estimate, about four characters per token plus the per-message overhead."""
+    return len(text or "") // 4 + 4
+
+
+def summary_message(summary):
+    return {"role": "system", "content": f"Summary of the earlier conversation: {summary}"}
+
+
+class ContextWindow:
+    """Keep the prompt under a token budget and fold older turns into a running summary.
+
+    Token counts are estimated once per message and cached by message id. Messages that fall out of
+    the window are condensed by summarize(previousSummary, messages) on a background thread, so
+    building the prompt never waits for the summary.
+
+    With stablePrefix the window does not slide by one turn at a time. Its start stays put until the
+    budget is exceeded and then jumps forward to shrinkTo of the budget, so consecutive prompts share
+    a byte-identical prefix and the backend only has to process the new turn.
+
+    With stablePrefix the summary after the system prompt is only replaced when the window jumps. A
+    summary that arrives between jumps is inserted as a message after the turns already sent, where
+    it stays until the next jump, so the cached prefix before it is still reused.
+    """
+
+    def __init__(self, tokenBudget, summarize=None, maxSummaryInputTokens=2048, stablePrefix=False, shrinkTo=0.5):
+        self.tokenBudget = tokenBudget
+        self.summarize = summarize
+        self.maxSummaryInputTokens = maxSummaryInputTokens
+        self.stablePrefix = stablePrefix
+        self.shrinkTo = shrinkTo
+        self.windowStartId = 0  # first message of the window in stablePrefix mode
+        self.tokenCache = {}  # message id -> estimated tokens
+        self.summary = ""
+        self.summarizedUpTo = 0  # id of the last message folded into the summary
+        self.promptSummary = ""  # summary after the system prompt, with stablePrefix only replaced at jumps
+        self.promptSummaryUpTo = 0
+        self.lateSummary = ""  # newer summary that arrived between jumps
+        self.lateSummaryUpTo = 0
+        self.lateSummaryAfterId = None  # message the late summary is inserted after
+        self.summaryRunning = False
+        self.lock = threading.Lock()
+
+    def tokens(self, message):
+        messageId = message.get("id")
+        if messageId is None:
+            return estimate_tokens(message.get("content"))
+        if messageId not in self.tokenCache:
+            self.tokenCache[messageId] = estimate_tokens(message.get("content"))
+        return self.tokenCache[messageId]
+
+    def build(self, systemPrompt, messages):
+        """Return the prompt messages: system prompt, summary, then the newest turns that fit."""
+        with self.lock:
+            if not self.stablePrefix:
+                self._adopt_summary()
+            elif self.summarizedUpTo > max(self.promptSummaryUpTo, self.lateSummaryUpTo):
+                # goes before the new message, after the turns the backend already has cached
+                self.lateSummary = self.summary
+                self.lateSummaryUpTo = self.summarizedUpTo
+                self.lateSummaryAfterId = messages[-2].get("id") if len(messages) > 1 else None
+            summary = self.promptSummary
+            late = self.lateSummary
+            lateAfterId = self.lateSummaryAfterId
+
+        budget = self.tokenBudget - sum(estimate_tokens(text) for text in (systemPrompt, summary, late) if text)
+        if self.stablePrefix:
+            startBefore = self.windowStartId
+            window = self._stable_window(messages, budget)
+            if self.windowStartId != startBefore:
+                with self.lock:
+                    self._adopt_summary()  # the prefix changes anyway
+                    summary = self.promptSummary
+                    late = ""
+        else:
+            window = self._sliding_window(messages, budget)
+
+        if window and len(window) < len(messages):
+            self._summarize_dropped(messages[: len(messages) - len(window)])
+
+        prompt = [{"role": "system", "content": systemPrompt}]
+        if summary:
+            prompt.append(summary_message(summary))
+        for m in window:
+            # "raw" is the reply exactly as the model generated it, which is what the backend has cached
+            prompt.append({"role": m.get("role"), "content": m.get("raw", m.get("content"))})
+            if late and m.get("id") == lateAfterId:
+                prompt.append(summary_message(late))
+                late = ""
+        if late:
+            prompt.insert(len(prompt) - 1, summary_message(late))
+        return prompt
+
+    def _adopt_summary(self):
+        """Put the newest summary after the system prompt, must hold the lock."""
+        self.promptSummary = self.summary
+        self.promptSummaryUpTo = self.summarizedUpTo
+        self.lateSummary = ""
+        self.lateSummaryUpTo = 0
+        self.lateSummaryAfterId = None
+
+    def _sliding_window(self, messages, budget):
+        """The newest messages that fit the budget."""
+        window = []
+        used = 0
+        for message in reversed(messages):
+            cost = self.tokens(message)
+            if window and used + cost > budget:
+                break  # the newest message is always sent, even if it alone is over budget
+            window.append(message)
+            used += cost
+        window.reverse()
+        return window
+
+    def _stable_window(self, messages, budget):
+        """Messages from windowStartId on, moving windowStartId only when the budget is exceeded."""
+        window = [m for m in messages if m.get("id", 0) >= self.windowStartId]
+        used = sum(self.tokens(m) for m in window)
+        if used <= budget:
+            return window
+
+        target = budget * self.shrinkTo
+        while len(window) > 1 and (used > target or window[0].get("role") != "user"):
+            used -= self.tokens(window.pop(0))
+        self.windowStartId = window[0].get("id", 0)
+        print(f"Context window moved to message {self.windowStartId}")
+        return window
+
+    def reset(self):
+        with self.lock:
+            self.summary = ""
+            self.summarizedUpTo = 0
+            self._adopt_summary()
+            self.windowStartId = 0
+            self.tokenCache.clear()
+
+    def forget(self, messages):
+        """Drop cached token counts of messages that are no longer stored."""
+        for message in messages:
+            self.tokenCache.pop(message.get("id"), None)
+
+    def _summarize_dropped(self, dropped):
+        if self.summarize is None:
+            return
+
+        with self.lock:
+            if self.summaryRunning:
+                return  # the next turn picks up whatever this run does not cover
+            pending = [m for m in dropped if m.get("id", 0) > self.summarizedUpTo]
+            if not pending:
+                return
+            self.summaryRunning = True
+            previousSummary = self.summary
+
+        # Turns that are too old for the summarizer's own budget are skipped
+        batch = []
+        used = 0
+        for message in reversed(pending):
+            used += self.tokens(message)
+            if batch and used > self.maxSummaryInputTokens:
+                break
+            batch.append(message)
+        batch.reverse()
+
+        threading.Thread(target=self._run_summary, args=(previousSummary, batch, pending[-1].get("id", 0)), daemon=True).start()
+
+    def _run_summary(self, previousSummary, batch, upToId):
+        try:
+            summary = self.summarize(previousSummary, batch)
+            with self.lock:
+                if upToId > self.summarizedUpTo:
+                    self.summary = summary
+                    self.summarizedUpTo = upToId
+            print(f"Conversation summary updated up to message {upToId}")
+        except Exception as e:
+            print(f"Error while summarizing conversation: {e}")
+        finally:
+            with self.lock:
+                self.summaryRunning = False
@@ -0,0 +1,163 @@
+"""Fast path for simple commands: a precompiled pattern index and handlers that answer without the LLM."""
+import re, threading
+from datetime import datetime
+
+# Said before or after a command without changing it, e.g. "hey zelna, what time is it please"
+POLITE_PREFIX = r"(?:(?:hey|ok|okay) )?(?:zelna )?(?:please |can you |could you )?"
+POLITE_SUFFIX = r"(?: please| now)?"
+
+
+class IntentResult:
+    """Answer of an intent handler.
+
+    text is shown as the reply and spoken, action is a dict sent to the client as an "action" event.
+    With show=False the text is only spoken; with store=True the exchange is kept in the chat history.
+    """
+
+    def __init__(self, text="", action=None, show=True, speak=True, store=False):
+        self.text = text
+        self.action = action
+        self.show = show and bool(text)
+        self.speak = speak and bool(text)
+        self.store = store
+
+
+class IntentRouter:
+    """Match a message against all registered intents with one precompiled regular expression.
+
+    Every intent is a named group of the combined pattern, so a message is matched in one pass and
+    match.lastgroup names the intent. Handlers are called as handler(match, reply) with the history
+    lock of the session held.
+    """
+
+    def __init__(self):
+        self.handlers = {}  # intent name -> handler
+        self.patterns = {}  # intent name -> [pattern]
+        self.index = None
+        self.lock = threading.Lock()
+        self.hits = {}  # intent name -> count
+        self.misses = 0
+
+    def intent(self, name, *patterns):
+        """Decorator registering a handler for messages that fully match one of the patterns."""
+        def register(handler):
+            self.handlers[name] = handler
+            self.patterns[name] = list(patterns)
+            self.index = self._compile()
+            return handler
+        return register
+
+    def _compile(self):
+        alternatives = "|".join(f"(?P<{name}>{'|'.join(patterns)})" for name, patterns in self.patterns.items())
+        return re.compile(f"{POLITE_PREFIX}(?:{alternatives}){POLITE_SUFFIX}")
+
+    @staticmethod
+    def normalize(text):
+        """Lower case words separated by single spaces, "What's the time?" -> "whats the time"."""
+        text = text.lower().replace("'", "").replace("’", "")
+        return " ".join(re.sub(r"[^a-z0-9]+", " ", text).split())
+
+    def match(self, text):
+        """Return (intent name, match) for a message, or None if it should go to the LLM."""
+        found = self.index.fullmatch(self.normalize(text)) if self.index else None
+        with self.lock:
+            if found is None:
+                self.misses += 1
+                return None
+            self.hits[found.lastgroup] = self.hits.get(found.lastgroup, 0) + 1
+        return found.lastgroup, found
+
+    def answer(self, name, match, reply):
+        """Run the handler of a matched intent, returns its IntentResult."""
+        return self.handlers[name](match, reply)
+
+    def stats(self):
+        with self.lock:
+            hits = sum(self.hits.values())
+            lookups = hits + self.misses
+            return {
+                "hits": dict(self.hits),
+                "misses": self.misses,
+                "hitRate": hits / lookups if lookups else 0.0,
+            }
+
+
+router = IntentRouter()
+
+# Replies that never change, synthesized into the audio cache at startup
+VOLUME_REPLIES = {"up": "Volume up.", "down": "Volume down.", "mute": "Muted.", "unmute": "Sound is back on."}
+NOTHING_TO_REPEAT = "There is nothing to repeat yet."
+FIXED_REPLIES = [*VOLUME_REPLIES.values(), NOTHING_TO_REPEAT]
+
+
+@router.intent(
+    "time",
+    r"what(?:s| is) the time",
+    r"what time is it",
+    r"(?:tell me )?the (?:current )?time",
+    r"current time",
+)
+def tell_time(match, reply):
+    now = datetime.now()
+    return IntentResult(f"It's {now.strftime('%I:%M %p').lstrip('0')}.", store=True)
+
+
+@router.intent(
+    "date",
+    r"what(?:s| is) (?:the date|the date today|todays date)",
+    r"what day is (?:it|today)(?: today)?",
+    r"(?:tell me )?(?:the date|todays date)",
+)
+def tell_date(match, reply):
+    now = datetime.now()
+    return IntentResult(f"Today is {now:%A}, {now:%B} {now.day}, {now.year}.", store=True)
+
+
+@router.intent(
+    "clear",
+    r"clear ?messages",
+    r"clear (?:the |my )?(?:chat|history|conversation)",
+)
+def clear_messages(match, reply):
+    reply.session.clear()
+    reply.session.emit("initialize", [])  # Reset client-side chat history
+    print(f"Messages of session {reply.session.key} cleared")
+    return IntentResult()
+
+
+@router.intent(
+    "volume",
+    r"(?:turn )?(?:the )?volume (?P<volumeDirection>up|down)",
+    r"(?:turn it |speak )?(?P<volumeLouder>louder)",
+    r"(?:turn it |speak )?(?P<volumeQuieter>quieter|softer)",
+    r"(?P<volumeMute>mute|unmute)(?: the volume| yourself)?",
+)
+def change_volume(match, reply):
+    direction = match.group("volumeDirection") or match.group("volumeMute")
+    if match.group("volumeLouder"):
+        direction = "up"
+    elif match.group("volumeQuieter"):
+        direction = "down"
+    return IntentResult(VOLUME_REPLIES[direction], action={"action": "volume", "direction": direction}, show=False)
+
+
+@router.intent(
+    "scroll",
+    r"scroll (?P<scrollDirection>up|down)",
+)
+def scroll(match, reply):
+    return IntentResult(action={"action": "scroll", "direction": match.group("scrollDirection")})
+
+
+@router.intent(
+    "repeat",
+    r"repeat(?: that| it| yourself)?(?: again)?",
+    r"say (?:that|it) again",
+    r"what did you (?:just )?say",
+    r"come again",
+)
+def repeat_last_reply(match, reply):
+    for message in reversed(reply.session.messages):
+        if message.get("role") == "assistant":
+            return IntentResult(message.get("content", ""), show=False)
+    return IntentResult(NOTHING_TO_REPEAT)
@@ -0,0 +1,136 @@
+"""Registry of Ollama endpoints: health probes, least-outstanding-requests routing and per-backend stats."""
+import threading, time
+from contextlib import contextmanager
+import ollama
+from metrics import RollingHistogram
+
+
+class Backend:
+    """One Ollama endpoint and the model it serves; host None means OLLAMA_HOST or the local default."""
+
+    def __init__(self, name, host=None, model="llama3.2:latest", weight=1, probeTimeout=3):
+        self.name = name
+        self.host = host
+        self.model = model
+        self.weight = max(weight, 0.01)
+        self.client = ollama.Client(host=host)
+        self.asyncClient = ollama.AsyncClient(host=host)  # for the replies of zelnaAsyncServer.py
+        self.probeClient = ollama.Client(host=host, timeout=probeTimeout)
+        self.lock = threading.Lock()
+        self.healthy = True  # until a probe or a request says otherwise
+        self.inFlight = 0
+        self.requests = 0
+        self.failures = 0
+        self.lastError = None
+        self.latency = RollingHistogram(256)
+
+    def load(self):
+        """Outstanding requests per unit of weight, lower is better."""
+        return self.inFlight / self.weight
+
+    @contextmanager
+    def request(self):
+        """Count a request in flight; an exception marks the backend unhealthy until the next good probe."""
+        started = time.perf_counter()
+        with self.lock:
+            self.inFlight += 1
+            self.requests += 1
+        try:
+            yield self
+        except Exception as e:
+            self.mark_failed(e)
+            raise
+        finally:
+            with self.lock:
+                self.inFlight -= 1
+                self.latency.observe(time.perf_counter() - started)
+
+    def mark_failed(self, error):
+        with self.lock:
+            self.failures += 1
+            self.lastError = str(error)
+            self.healthy = False
+
+    def probe(self):
+        """Ask the endpoint for its models, healthy if it answers and has the model."""
+        try:
+            names = [m.get("model") or m.get("name") for m in self.probeClient.list().get("models", [])]
+            healthy = self.model in names or f"{self.model}:latest" in names
+            error = None if healthy else f"model {self.model} not found"
+        except Exception as e:
+            healthy, error = False, str(e)
+
+        with self.lock:
+            changed = healthy != self.healthy
+            self.healthy = healthy
+            self.lastError = error or self.lastError
+        if changed:
+            print(f"LLM backend {self.name} is {'healthy' if healthy else f'unhealthy: {error}'}")
+        return healthy
+
+    def stats(self):
+        with self.lock:
+            quantiles = self.latency.quantiles((0.5, 0.95))
+            return {
+                "healthy": int(self.healthy),
+                "inFlight": self.inFlight,
+                "requests": self.requests,
+                "failures": self.failures,
+                "latencyP50": quantiles[0.5],
+                "latencyP95": quantiles[0.95],
+            }
+
+
+class BackendRegistry:
+    """Pick the backend for every LLM request.
+
+    The healthy backend with the fewest requests in flight per weight wins. A session keeps using the
+    backend of its last reply, where its prompt prefix is cached, while that one is at most
+    affinitySlack requests busier. If no backend is healthy all of them are tried anyway.
+    """
+
+    def __init__(self, backends, probeInterval=15, affinitySlack=1):
+        self.backends = list(backends)
+        self.byName = {b.name: b for b in self.backends}
+        self.probeInterval = probeInterval
+        self.affinitySlack = affinitySlack
+        self.started = False
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config, defaultModel, probeInterval=15, affinitySlack=1):
+        """Build the registry from a list of {"name", "host", "model", "weight"} dicts."""
+        backends = [
+            Backend(c.get("name") or c.get("host") or "default", c.get("host"), c.get("model") or defaultModel, c.get("weight", 1))
+            for c in config
+        ]
+        return cls(backends, probeInterval, affinitySlack)
+
+    def start(self):
+        with self.lock:
+            if self.started or not self.probeInterval:
+                return
+            self.started = True
+        threading.Thread(target=self._probeLoop, name="llm-backend-probes", daemon=True).start()
+
+    def _probeLoop(self):
+        while True:
+            for backend in self.backends:
+                backend.probe()
+            time.sleep(self.probeInterval)
+
+    def choose(self, exclude=(), prefer=None):
+        """Return the backend for the next request, or None once every backend has been excluded."""
+        candidates = [b for b in self.backends if b.name not in exclude]
+        if not candidates:
+            return None
+        healthy = [b for b in candidates if b.healthy] or candidates
+
+        best = min(healthy, key=lambda b: (b.load(), -b.weight))
+        preferred = self.byName.get(prefer)
+        if preferred in healthy and preferred.load() <= best.load() + self.affinitySlack / preferred.weight:
+            return preferred
+        return best
+
+    def stats(self):
+        return {b.name: b.stats() for b in self.backends}
@@ -0,0 +1,122 @@
+import threading, time
+from collections import deque
+from contextlib import contextmanager
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class RollingHistogram:
+    """The last `size` observations of a duration, with their count and sum since start."""
+
+    def __init__(self, size=1024):
+        self.samples = deque(maxlen=size)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.samples.append(value)
+        self.count += 1
+        self.sum += value
+
+    def quantiles(self, qs=QUANTILES):
+        ordered = sorted(self.samples)
+        if not ordered:
+            return {q: 0.0 for q in qs}
+        return {q: ordered[min(len(ordered) - 1, int(q * len(ordered)))] for q in qs}
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+class Metrics:
+    """Counters, gauges and rolling per-stage latency summaries, rendered in Prometheus text format."""
+
+    def __init__(self, prefix="zelna", windowSize=1024):
+        self.prefix = prefix
+        self.windowSize = windowSize
+        self.lock = threading.Lock()
+        self.counters = {}  # (name, labels) -> value
+        self.stages = {}  # stage -> RollingHistogram
+        self.gauges = {}  # name -> (function returning a number, help text, metric type, label)
+        self.help = {}
+
+    def inc(self, name, amount=1, help="", **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+            if help:
+                self.help[name] = help
+
+    def gauge(self, name, function, help="", kind="gauge", label=None):
+        """Register a value that is read when the metrics are rendered, kind "counter" for running totals.
+
+        With a label the function returns {label value: number}, one series per entry.
+        """
+        with self.lock:
+            self.gauges[name] = (function, help, kind, label)
+
+    def observe(self, stage, seconds):
+        with self.lock:
+            if stage not in self.stages:
+                self.stages[stage] = RollingHistogram(self.windowSize)
+            self.stages[stage].observe(seconds)
+
+    @contextmanager
+    def span(self, stage):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started)
+
+    def stage_quantiles(self):
+        """{stage: {quantile: seconds}} over the rolling window."""
+        with self.lock:
+            return {stage: histogram.quantiles() for stage, histogram in self.stages.items()}
+
+    def render(self):
+        lines = []
+        with self.lock:
+            counters = sorted(self.counters.items())
+            stages = sorted(self.stages.items())
+            gauges = sorted(self.gauges.items())
+            helps = dict(self.help)
+
+            summary = f"{self.prefix}_stage_seconds"
+            lines.append(f"# HELP {summary} Latency of each request stage over the last {self.windowSize} observations.")
+            lines.append(f"# TYPE {summary} summary")
+            for stage, histogram in stages:
+                for q, value in histogram.quantiles().items():
+                    lines.append(f'{summary}{{stage="{stage}",quantile="{q}"}} {value:.6f}')
+                lines.append(f'{summary}_sum{{stage="{stage}"}} {histogram.sum:.6f}')
+                lines.append(f'{summary}_count{{stage="{stage}"}} {histogram.count}')
+
+        seen = set()
+        for (name, labels), value in counters:
+            metric = f"{self.prefix}_{name}"
+            if name not in seen:
+                seen.add(name)
+                if name in helps:
+                    lines.append(f"# HELP {metric} {helps[name]}")
+                lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric}{_labels(labels)} {value}")
+
+        for name, (function, help, kind, label) in gauges:
+            metric = f"{self.prefix}_{name}"
+            try:
+                value = function()
+            except Exception:
+                continue
+            if help:
+                lines.append(f"# HELP {metric} {help}")
+            lines.append(f"# TYPE {metric} {kind}")
+            if label is None:
+                lines.append(f"{metric} {value}")
+                continue
+            for labelValue, number in sorted(value.items()):
+                lines.append(f"{metric}{_labels([(label, labelValue)])} {number}")
+
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,150 @@
+"""Speech recognition of microphone audio streamed by the clients, with a shared Vosk model."""
+import json, threading, time
+
+try:
+    from vosk import Model, KaldiRecognizer, SetLogLevel
+except ImportError:  # server-side speech recognition is optional
+    Model = None
+
+
+class RecognizerPool:
+    """One Vosk model shared by at most `size` recognizers working at the same time.
+
+    The model is loaded by load(), usually on a background thread; until then acquire() returns None.
+    A disabled pool never loads it. Recognizers are reset and reused for the next stream with the same
+    sample rate.
+    """
+
+    def __init__(self, modelName, size=2, enabled=True):
+        self.modelName = modelName
+        self.size = size
+        self.model = None
+        self.error = None if Model is not None else "vosk is not installed on the server"
+        if not enabled:
+            self.error = "Speech recognition is turned off on the server"
+        self.loaded = threading.Event()
+        self.slots = threading.Semaphore(size)
+        self.idle = {}  # sample rate -> [KaldiRecognizer]
+        self.lock = threading.Lock()
+
+    def load(self):
+        if self.error is None:
+            started = time.perf_counter()
+            try:
+                SetLogLevel(-1)
+                self.model = Model(model_name=self.modelName)
+                print(f"Speech recognition model {self.modelName} loaded in {time.perf_counter() - started:.1f} s")
+            except Exception as e:
+                self.error = f"Speech recognition model could not be loaded: {e}"
+                print(self.error)
+        self.loaded.set()
+
+    def unavailable_reason(self):
+        if self.error:
+            return self.error
+        if not self.loaded.is_set():
+            return "Speech recognition model is still loading, try again in a moment"
+        return "Speech recognition is busy, try again in a moment"
+
+    def acquire(self, samplerate, timeout=5):
+        """Return a recognizer for audio at samplerate, or None if none is available in time."""
+        if self.model is None or not self.slots.acquire(timeout=timeout):
+            return None
+        with self.lock:
+            idle = self.idle.get(samplerate)
+            if idle:
+                return idle.pop()
+        try:
+            return KaldiRecognizer(self.model, samplerate)
+        except Exception:
+            self.slots.release()
+            raise
+
+    def release(self, recognizer, samplerate):
+        recognizer.Reset()
+        with self.lock:
+            self.idle.setdefault(samplerate, []).append(recognizer)
+        self.slots.release()
+
+
+class SpeechStream:
+    """Recognize one utterance streamed as numbered frames, which may arrive out of order.
+
+    Partial results go to onPartial(text) with the same text joining as the on-device recognizer.
+    add_frame() and end() return the transcript on the call that completes the stream, else None.
+    """
+
+    def __init__(self, pool, recognizer, samplerate, onPartial):
+        self.pool = pool
+        self.recognizer = recognizer
+        self.samplerate = samplerate
+        self.onPartial = onPartial
+        self.frames = {}  # seq -> pcm bytes that arrived ahead of an earlier frame
+        self.nextSeq = 0
+        self.frameCount = None  # set by end()
+        self.endedAt = None
+        self.done = False
+        self.lock = threading.Lock()
+
+        self.prevPartialText = ""
+        self.finalText = ""
+        self.lastWord = ""
+
+    def add_frame(self, seq, data):
+        with self.lock:
+            if self.done:
+                return None
+            self.frames[seq] = data
+            return self._drain()
+
+    def end(self, frameCount):
+        with self.lock:
+            if self.done:
+                return None
+            self.frameCount = frameCount
+            self.endedAt = time.perf_counter()
+            return self._drain()
+
+    def abort(self):
+        """Drop the stream, e.g. when its client disconnects."""
+        with self.lock:
+            if not self.done:
+                self.done = True
+                self.pool.release(self.recognizer, self.samplerate)
+
+    def _drain(self):
+        while self.nextSeq in self.frames:
+            self._accept(self.frames.pop(self.nextSeq))
+            self.nextSeq += 1
+
+        if self.frameCount is None or self.nextSeq < self.frameCount:
+            return None
+
+        self._add_final(json.loads(self.recognizer.FinalResult()).get("text", ""))
+        self.done = True
+        self.pool.release(self.recognizer, self.samplerate)
+        return self.finalText.strip()
+
+    def _accept(self, data):
+        if self.recognizer.AcceptWaveform(data):
+            self._add_final(json.loads(self.recognizer.Result()).get("text", ""))
+            return
+
+        partialResult = json.loads(self.recognizer.PartialResult()).get("partial", "").strip()
+        if partialResult != self.prevPartialText:
+            combinedText = self.finalText
+            if self.finalText and partialResult and not partialResult.startswith(self.lastWord):
+                combinedText += " "
+            combinedText += partialResult
+            self.onPartial(combinedText.strip())
+            self.prevPartialText = partialResult
+
+    def _add_final(self, text):
+        text = text.strip()
+        if not text:
+            return
+        if self.finalText and not self.finalText.endswith(" "):
+            self.finalText += " "
+        self.finalText += text
+        self.prevPartialText = ""
+        self.lastWord = text.split()[-1]
@@ -0,0 +1,190 @@
+import os, pickle, queue, subprocess, sys, threading, time
+
+# Workers run this file as their own script and talk over stdin/stdout. multiprocessing's spawn would
+# re-run the server's main script in every worker, on every restart: Flask, Socket.IO, ollama, vosk
+# and the module-level caches, where a worker only needs pyttsx3.
+WORKER_SCRIPT = os.path.abspath(__file__)
+
+
+def _worker_main(workerId, voiceId, rate, tempDir, mp3Bitrate):
+    """Entry point of a TTS worker process: synthesize every text received on stdin, answer on stdout."""
+    # answers go to the real stdout, anything the speech engine prints ends up on stderr
+    answers = os.fdopen(os.dup(sys.stdout.fileno()), "wb")
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+
+    def answer(result):
+        pickle.dump(result, answers)
+        answers.flush()
+
+    import pyttsx3
+    from audioEncoder import encode_wav_file
+
+    engine = pyttsx3.init()
+    engine.setProperty("rate", rate)
+    engine.setProperty("volume", 1.0)
+    voices = engine.getProperty("voices")
+    engine.setProperty("voice", voices[voiceId].id)
+
+    wavPath = os.path.join(tempDir, f"tts_worker_{workerId}.wav")
+
+    while True:
+        try:
+            request = pickle.load(sys.stdin.buffer)
+        except EOFError:
+            break  # server went away
+        if request is None:
+            break
+
+        text, audioFormat = request
+        try:
+            # pyttsx3 can only synthesize to a file
+            started = time.perf_counter()
+            engine.save_to_file(text, wavPath)
+            engine.runAndWait()
+            synthesized = time.perf_counter()
+            speech = encode_wav_file(wavPath, audioFormat, mp3Bitrate)
+            timings = {"tts_synthesize": synthesized - started, "tts_encode": time.perf_counter() - synthesized}
+            answer(("ok", speech, timings))
+        except Exception as e:
+            answer(("error", str(e), {}))
+
+
+class TTSWorker:
+    """One long-lived TTS process and the pipes used to talk to it."""
+
+    def __init__(self, workerId, voiceId, rate, tempDir, mp3Bitrate):
+        self.workerId = workerId
+        self.voiceId = voiceId
+        self.rate = rate
+        self.tempDir = tempDir
+        self.mp3Bitrate = mp3Bitrate
+        self.process = None
+        self.answers = None
+
+    def start(self):
+        self.process = subprocess.Popen(
+            [sys.executable, WORKER_SCRIPT, str(self.workerId), str(self.voiceId), str(self.rate), self.tempDir, self.mp3Bitrate],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+        )
+        # a reader thread per process so synthesize can wait with a timeout on any platform
+        self.answers = queue.Queue()
+        threading.Thread(
+            target=self._read_answers,
+            args=(self.process, self.answers),
+            name=f"tts-process-{self.workerId}",
+            daemon=True,
+        ).start()
+
+    def _read_answers(self, process, answers):
+        try:
+            while True:
+                answers.put(pickle.load(process.stdout))
+        except Exception:  # EOFError, or a torn answer from a dying process
+            answers.put(None)
+
+    def _send(self, request):
+        pickle.dump(request, self.process.stdin)
+        self.process.stdin.flush()
+
+    def _close(self, timeout):
+        try:
+            self.process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            self.process.terminate()
+            self.process.wait(timeout=1)
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass
+
+    def stop(self):
+        if self.process is None:
+            return
+        try:
+            self._send(None)
+        except (OSError, ValueError):
+            pass
+        self._close(timeout=1)
+
+    def restart(self):
+        if self.process is not None:
+            self.process.terminate()
+            self._close(timeout=1)
+        self.start()
+
+    def synthesize(self, text, audioFormat, timeout):
+        """Return ((audio bytes, format info), stage timings); raises EOFError/OSError/TimeoutError if the process is gone or stuck."""
+        self._send((text, audioFormat))
+        try:
+            answer = self.answers.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError(f"no answer within {timeout} seconds")
+        if answer is None:
+            raise EOFError("TTS process exited")
+
+        status, result, timings = answer
+        if status == "error":
+            raise RuntimeError(result)
+        return result, timings
+
+
+class TTSWorkerPool:
+    """Pool of long-lived TTS processes, each with its own pre-initialized pyttsx3 engine.
+
+    synthesize() may be called from several threads; every call borrows an idle worker, so up to
+    `size` texts are synthesized in parallel. A worker that crashes or hangs is restarted.
+    """
+
+    def __init__(self, size, voiceId, rate, tempDir="temp", timeout=60, mp3Bitrate="32k"):
+        self.size = size
+        self.timeout = timeout
+        self.workers = [TTSWorker(i, voiceId, rate, tempDir, mp3Bitrate) for i in range(size)]
+        self.idle = queue.Queue()
+        self.lock = threading.Lock()
+        self.started = False
+        self.restarts = 0
+
+    def start(self):
+        with self.lock:
+            if self.started:
+                return
+            self.started = True
+
+        for worker in self.workers:
+            worker.start()
+            self.idle.put(worker)
+
+    def stop(self):
+        for worker in self.workers:
+            worker.stop()
+
+    def synthesize(self, text, audioFormat="mp3", timings=None):
+        """Synthesize text on an idle worker, returns (audio bytes, format info) or None on failure.
+
+        If a timings dict is given, the seconds spent synthesizing and encoding are added to it.
+        """
+        worker = self.idle.get()
+        try:
+            for attempt in range(2):
+                try:
+                    speech, workerTimings = worker.synthesize(text, audioFormat, self.timeout)
+                    if timings is not None:
+                        for stage, seconds in workerTimings.items():
+                            timings[stage] = timings.get(stage, 0) + seconds
+                    return speech
+                except (EOFError, OSError, TimeoutError) as e:
+                    print(f"TTS worker {worker.workerId} failed ({e!r}), restarting it")
+                    with self.lock:
+                        self.restarts += 1
+                    worker.restart()
+                except RuntimeError as e:
+                    print(f"Error while running TTS or encoding audio: {e}")
+                    return None
+            return None
+        finally:
+            self.idle.put(worker)
+
+
+if __name__ == "__main__":
+    _worker_main(int(sys.argv[1]), int(sys.argv[2]), int(sys.argv[3]), sys.argv[4], sys.argv[5])
@@ -0,0 +1,454 @@
+"""Asyncio entry point with the same Socket.IO events as zelnaServer.py, for many mostly idle handhelds.
+
+Connections are coroutines on python-socketio's AsyncServer instead of threads, and replies are generated
+on the event loop with ollama's AsyncClient, at most LLM_WORKERS at a time. Everything else is
+zelnaServer.py's: the event handling, sessions, intents, the TTS workers, speech recognition and metrics.
+Blocking calls (history writes, Vosk) run in threads, and events from the worker threads are sent by one
+task per session so they arrive in order.
+Run from this directory with:  python zelnaAsyncServer.py
+"""
+import asyncio, threading, time
+import socketio
+from aiohttp import web
+
+import zelnaServer as shared
+from zelnaServer import (
+    LLM_WORKERS, MAX_QUEUED_REQUESTS, OLLAMA_KEEP_ALIVE, RESPONSE_FAILED_MESSAGE, SENTENCE_PIPELINE,
+    STREAM_RESPONSES, SYSTEM_PROMPT, WARMUP_ON_START, clean_text, log_llm_latency, metrics,
+)
+
+sio = socketio.AsyncServer(async_mode="aiohttp", cors_allowed_origins="*")
+backgroundTasks = set()  # asyncio only keeps weak references to tasks
+llmRequests = {}  # request id -> task waiting for the LLM, cancelled together with its reply
+speechFeeds = {}  # stream id -> SpeechFeed of a client streaming its microphone
+replies = None  # AsyncScheduler of the LLM replies, created by create_app
+
+
+def spawn(coroutine):
+    """Run a coroutine in the background and keep it alive until it is done."""
+    task = asyncio.create_task(coroutine)
+    backgroundTasks.add(task)
+    task.add_done_callback(backgroundTasks.discard)
+    return task
+
+
+class AsyncSession(shared.Session):
+    """Session whose events, to its room or to one of its clients, are sent in order by one task.
+
+    emit() and the client emitters may be called from the event loop and from worker threads alike.
+    """
+
+    def __init__(self, key):
+        super().__init__(key)
+        self.outbox = asyncio.Queue()
+        self.loop = None
+        self.replyLock = asyncio.Lock()  # one LLM reply at a time per handheld
+        self.replyScheduler = replies
+
+    def start(self, loop):
+        self.loop = loop
+        spawn(self._send())
+
+    def emit(self, event, data):
+        self.loop.call_soon_threadsafe(self.outbox.put_nowait, (event, data, self.room))
+
+    def client_emitter(self, sid):
+        """emit(event, data) for one client of this session."""
+        return lambda event, data: self.loop.call_soon_threadsafe(self.outbox.put_nowait, (event, data, sid))
+
+    async def _send(self):
+        while True:
+            event, data, to = await self.outbox.get()
+            try:
+                await sio.emit(event, data, to=to)
+            except Exception as e:
+                print(f"Failed to send {event} to session {self.key}: {e}")
+
+
+class AsyncScheduler:
+    """Bounded queue of reply requests, answered by LLM_WORKERS tasks on the event loop.
+
+    Takes the place of zelnaServer.Scheduler for the replies; submit() may also be called from worker
+    threads, e.g. once speech recognition has finished. TTS still runs on the shared scheduler.
+    """
+
+    def __init__(self, llmWorkers=LLM_WORKERS, maxQueued=MAX_QUEUED_REQUESTS):
+        self.llmWorkers = llmWorkers
+        self.maxQueued = maxQueued
+        self.requests = asyncio.Queue()  # bounded by submit()
+        self.queued = 0
+        self.activeRequests = 0
+        self.lock = threading.Lock()
+        self.loop = None
+
+    def start(self, loop):
+        self.loop = loop
+        for i in range(self.llmWorkers):
+            spawn(self._llmWorker())
+
+    def submit(self, reply):
+        """Queue a reply request, returns its position in the queue or None when the queue is full."""
+        with self.lock:
+            if self.queued >= self.maxQueued:
+                return None
+            self.queued += 1
+            position = self.queued
+        self.loop.call_soon_threadsafe(self.requests.put_nowait, reply)
+        return position
+
+    def depth(self):
+        with self.lock:
+            return self.queued
+
+    def saturated(self):
+        """True when every LLM worker is busy, so new messages have to wait."""
+        with self.lock:
+            return self.activeRequests >= self.llmWorkers
+
+    def stats(self):
+        with self.lock:
+            return {"queued": self.queued, "active": self.activeRequests}
+
+    async def _llmWorker(self):
+        while True:
+            reply = await self.requests.get()
+            with self.lock:
+                self.queued -= 1
+            reply.record("queue", time.perf_counter() - reply.created)
+            if reply.is_cancelled():
+                metrics.inc("cancelled_total", help="Replies cancelled by the client.")
+                shared.finish_reply(reply)
+                print(f"Request {reply.requestId} cancelled before it started")
+                continue
+
+            with self.lock:
+                self.activeRequests += 1
+            try:
+                async with reply.session.replyLock:
+                    await process_message(reply)
+            except Exception as e:
+                print(f"Error in LLM worker: {e}")
+            finally:
+                if reply.pipeline is None:
+                    shared.finish_reply(reply)
+                with self.lock:
+                    self.activeRequests -= 1
+
+
+async def call_llm(function, prefer=None):
+    """zelnaServer.call_llm for a coroutine function(backend)."""
+    tried = set()
+    lastError = RuntimeError("No LLM backend configured")
+    while True:
+        backend = shared.llmBackends.choose(exclude=tried, prefer=prefer)
+        if backend is None:
+            raise lastError
+        tried.add(backend.name)
+        try:
+            with backend.request():
+                return await function(backend), backend
+        except Exception as e:
+            lastError = e
+            print(f"LLM backend {backend.name} failed ({e}), trying another one")
+
+
+async def cancellable(reply, coroutine):
+    """Await coroutine in a task that cancelling the reply stops, returns None if it was cancelled."""
+    task = asyncio.create_task(coroutine)
+    llmRequests[reply.requestId] = task
+    if reply.is_cancelled():  # cancelled while the backend was chosen
+        task.cancel()
+    try:
+        return await task
+    except asyncio.CancelledError:
+        if not reply.is_cancelled():
+            raise  # the server is shutting down
+        print("Generation cancelled")
+        return None
+    finally:
+        llmRequests.pop(reply.requestId, None)
+
+
+async def chat_with_history(reply, onChunk=None):
+    """zelnaServer.chatWithHistory with the LLM request awaited instead of blocking a thread.
+
+    Cancelling the reply closes the request, so Ollama stops generating; a streamed reply keeps what
+    was generated until then.
+    """
+    session = reply.session
+    # Building the prompt may summarize old turns and stores the user's message, both block
+    temp_messages = await asyncio.to_thread(session.begin_reply, reply.text, SYSTEM_PROMPT)
+    message = None
+    try:
+        started = time.perf_counter()
+        if onChunk is None:
+            async def generate(backend):
+                response = await cancellable(reply, backend.asyncClient.chat(
+                    model=backend.model, messages=temp_messages, options={"temperature": 0.8}, keep_alive=OLLAMA_KEEP_ALIVE
+                ))
+                if response is None:
+                    return "", ""
+                log_llm_latency(response, started)
+                return response["message"]["content"], clean_text(response["message"]["content"])
+        else:
+            async def generate(backend):
+                # Failing before the first chunk tries the next backend, after it the partial reply is kept
+                parts = []
+                rawParts = []
+
+                async def read():
+                    firstTokenAt = None
+                    stream = await backend.asyncClient.chat(
+                        model=backend.model, messages=temp_messages, options={"temperature": 0.8}, keep_alive=OLLAMA_KEEP_ALIVE, stream=True
+                    )
+                    try:
+                        async for part in stream:
+                            rawParts.append(part["message"]["content"])
+                            chunk = clean_text(part["message"]["content"])
+                            if chunk:
+                                firstTokenAt = firstTokenAt or time.perf_counter()
+                                parts.append(chunk)
+                                onChunk(chunk)
+                            if part.get("done"):
+                                log_llm_latency(part, started, firstTokenAt)
+                    finally:
+                        await stream.aclose()  # closes the HTTP response, so Ollama stops generating
+
+                try:
+                    await cancellable(reply, read())
+                except Exception as e:
+                    if not parts:
+                        raise
+                    print(f"LLM backend {backend.name} failed during the reply ({e}), keeping what was generated")
+                    backend.mark_failed(e)
+                return "".join(rawParts), "".join(parts)
+
+        (rawContent, responseContent), backend = await call_llm(generate, prefer=session.backendName)
+        session.backendName = backend.name
+
+        # Keep the unmodified reply for the prompt so the next turn matches Ollama's cached prefix
+        if responseContent:
+            message = {"role": "assistant", "content": responseContent}
+            if rawContent != responseContent:
+                message["raw"] = rawContent
+        return responseContent
+
+    except Exception as e:
+        print(f"Error while running ollama chat: {e}")
+        return RESPONSE_FAILED_MESSAGE
+
+    finally:
+        await asyncio.to_thread(session.end_reply, message)
+
+
+async def process_message(reply):
+    """zelnaServer.processMessage on the event loop."""
+    session = reply.session
+    try:
+        print(f"Message received from {session.key}: {reply.text}")
+
+        if SENTENCE_PIPELINE:
+            await process_message_pipelined(reply)
+            return
+
+        # Forward partial text to the client while ollama is still generating
+        def onChunk(chunk):
+            if "llm_first_token" not in reply.timings:
+                reply.record("llm_first_token", time.perf_counter() - llmStarted)
+            reply.emit("response_chunk", {"message": chunk, "sender": "server"})
+
+        llmStarted = time.perf_counter()
+        with reply.span("llm"):
+            response = await chat_with_history(reply, onChunk if STREAM_RESPONSES else None)
+        if response == RESPONSE_FAILED_MESSAGE:
+            metrics.inc("errors_total", help="Failed LLM requests and message handling errors.", stage="llm")
+        await asyncio.to_thread(session.compact_journal)
+        if shared.reply_cancelled(reply, response):
+            return
+
+        timings = {}
+        with reply.span("tts"):
+            speech = await asyncio.wrap_future(shared.scheduler.submit_tts(shared.synthesize_speech, response, timings))
+        reply.add_timings(timings)
+        shared.send_reply(reply, response, speech)
+
+    except Exception as e:
+        print(f"Error while handling message: {e}")
+        metrics.inc("errors_total", help="Failed LLM requests and message handling errors.", stage="message")
+        reply.emit(
+            "response", {"message": "Failed to process message", "sender": "server"}
+        )
+
+
+async def process_message_pipelined(reply):
+    """zelnaServer.processMessagePipelined on the event loop, the sentences still go to the TTS workers."""
+    speech = shared.SpeechPipeline(reply)
+    splitter = shared.SentenceSplitter()
+
+    def onChunk(chunk):
+        if "llm_first_token" not in reply.timings:
+            reply.record("llm_first_token", time.perf_counter() - llmStarted)
+        if STREAM_RESPONSES:
+            reply.emit("response_chunk", {"message": chunk, "sender": "server"})
+        for sentence in splitter.feed(chunk):
+            speech.put(sentence)
+
+    try:
+        llmStarted = time.perf_counter()
+        with reply.span("llm"):
+            response = await chat_with_history(reply, onChunk)
+        if response == RESPONSE_FAILED_MESSAGE:
+            metrics.inc("errors_total", help="Failed LLM requests and message handling errors.", stage="llm")
+
+        rest = splitter.flush()
+        if rest and not reply.is_cancelled():
+            speech.put(rest)
+        if speech.count == 0 and not reply.is_cancelled():
+            speech.put(response)  # nothing was streamed, e.g. the error message
+    finally:
+        speech.close()
+
+    await asyncio.to_thread(reply.session.compact_journal)
+    shared.send_streamed_reply(reply, response)
+
+
+class SpeechFeed:
+    """Frames of one microphone stream, recognized in a thread a batch at a time instead of one hop per frame.
+
+    Frames and the end marker are handed to Vosk in the order they arrived.
+    """
+
+    def __init__(self, streamId):
+        self.streamId = streamId
+        self.items = []  # (handler, data) waiting for the recognizer
+        self.running = False
+
+    def put(self, handler, data):
+        self.items.append((handler, data))
+        if not self.running:
+            self.running = True
+            spawn(self._drain())
+
+    async def _drain(self):
+        try:
+            while self.items:
+                batch, self.items = self.items, []
+                await asyncio.to_thread(self._recognize, batch)
+        finally:
+            self.running = False
+        if self.streamId not in shared.speechStreams:
+            speechFeeds.pop(self.streamId, None)  # recognized or aborted
+
+    def _recognize(self, batch):
+        for handler, data in batch:
+            handler(data)
+
+
+async def get_session(auth):
+    """Return the session for the connecting client, loading its history in a thread on first use."""
+    session = await asyncio.to_thread(shared.get_session, auth, AsyncSession)
+    if session.loop is None:
+        session.start(asyncio.get_running_loop())
+    return session
+
+
+@sio.event
+async def connect(sid, environ, auth):
+    """Handle client connections."""
+    try:
+        session = await get_session(auth)
+        await sio.enter_room(sid, session.room)
+        await asyncio.to_thread(shared.connect_client, session, sid, auth, session.client_emitter(sid))
+    except Exception as e:
+        print(f"Error during client connection: {e}")
+        await sio.emit("error", {"message": "Failed to initialize chat history"}, to=sid)
+
+
+@sio.event
+async def disconnect(sid, *args):
+    """Handle client disconnections."""
+    await asyncio.to_thread(shared.disconnect_client, sid)
+    for streamId in [s for s in speechFeeds if s not in shared.speechStreams]:
+        speechFeeds.pop(streamId)
+
+
+@sio.on("message")
+async def handleMessage(sid, message):
+    """Process incoming messages from the client."""
+    session = shared.sessionsBySid.get(sid)
+    if session is None:
+        await sio.emit("response", {"message": "Session not found, please reconnect", "sender": "info"}, to=sid)
+        return
+    # in a thread because an intent answer is written to the history right away
+    await asyncio.to_thread(shared.queue_reply, shared.reply_request(session, message), session.client_emitter(sid))
+
+
+@sio.on("cancel")
+async def handleCancel(sid, data):
+    reply = shared.cancel_reply(shared.sessionsBySid.get(sid), data)
+    task = llmRequests.get(reply.requestId) if reply is not None else None
+    if task is not None:
+        task.cancel()
+
+
+@sio.on("stt_start")
+async def handleSttStart(sid, data):
+    """The client sends frames only after this acknowledgement, see zelnaServer.start_speech_stream."""
+    session = shared.sessionsBySid.get(sid)
+    if session is None:
+        return {"error": "Session not found, please reconnect"}
+    # waits for a free recognizer
+    acknowledgement = await asyncio.to_thread(shared.start_speech_stream, session, sid, data, session.client_emitter(sid))
+    if "streamId" in acknowledgement:
+        speechFeeds[acknowledgement["streamId"]] = SpeechFeed(acknowledgement["streamId"])
+    return acknowledgement
+
+
+@sio.on("stt_audio")
+async def handleSttAudio(sid, data):
+    feed = speechFeeds.get(data.get("streamId"))
+    if feed is not None:
+        feed.put(shared.add_speech_frame, data)
+
+
+@sio.on("stt_end")
+async def handleSttEnd(sid, data):
+    feed = speechFeeds.get(data.get("streamId"))
+    if feed is not None:
+        feed.put(shared.end_speech_stream, data)
+
+
+async def metricsRoute(request):
+    """Prometheus text format: stage latency summaries, counters and queue gauges."""
+    return web.Response(body=metrics.render().encode("utf-8"), headers={"Content-Type": "text/plain; version=0.0.4"})
+
+
+def create_app(warmup=WARMUP_ON_START, llmWorkers=LLM_WORKERS, maxQueued=MAX_QUEUED_REQUESTS):
+    """Create the aiohttp app with the Socket.IO server attached."""
+    global replies
+    replies = AsyncScheduler(llmWorkers, maxQueued)
+
+    app = web.Application()
+    sio.attach(app)
+    app.router.add_get("/metrics", metricsRoute)
+
+    async def startup(app):
+        replies.start(asyncio.get_running_loop())
+        await asyncio.to_thread(shared.start_services, warmup, False)
+        metrics.gauge("queue_depth", replies.depth, "Messages waiting for an LLM worker.")
+        metrics.gauge("active_requests", lambda: replies.stats()["active"], "Messages being answered.")
+        metrics.gauge("connections", lambda: len(shared.sessionsBySid), "Connected handhelds.")
+
+    async def cleanup(app):
+        shared.ttsPool.stop()
+
+    app.on_startup.append(startup)
+    app.on_cleanup.append(cleanup)
+    return app
+
+
+if __name__ == "__main__":
+    try:
+        web.run_app(create_app(), host="0.0.0.0", port=5000)
+    except Exception as e:
+        print(f"SocketIO server failed to start: {e}")
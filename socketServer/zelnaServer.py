@@ -1,66 +1,709 @@
-import json, ollama, re, pyttsx3, base64, subprocess, os
-from flask import Flask
-from flask_socketio import SocketIO
+import re, base64, os, queue, threading, hashlib, shutil, time, uuid
+from concurrent.futures import Future
+from contextlib import contextmanager
+from flask import Flask, Response, request
+from flask_socketio import SocketIO, join_room
+from ttsWorkers import TTSWorkerPool
+from audioCache import AudioCache
+from chatJournal import ChatJournal
+from contextWindow import ContextWindow
+from metrics import Metrics
+from llmBackends import BackendRegistry
+from intents import router as intentRouter, FIXED_REPLIES as INTENT_REPLIES
+from speechRecognizer import RecognizerPool, SpeechStream
 
-# Initialize SocketIO and global message storage
+# Initialize SocketIO and per-handheld session storage
 socketio = SocketIO()
-messages = []
+sessions = {}  # session key -> Session
+sessionsBySid = {}  # Socket.IO sid -> Session
+sessionsLock = threading.Lock()
+pendingReplies = {}  # request id -> ReplyRequest, from queued until answered
+pendingRepliesLock = threading.Lock()
+speechStreams = {}  # stream id -> {"stream": SpeechStream, "sid", "session", "requestId", "emit"} of a client streaming its microphone
+speechStreamsLock = threading.Lock()
+metrics = Metrics()
 
 LANGUAGE_MODEL = "llama3.2:latest"
+# Ollama servers replies are generated on; host None is OLLAMA_HOST or the local default
+LLM_BACKENDS = [
+    {"name": "local", "host": None, "model": LANGUAGE_MODEL, "weight": 1},
+    # {"name": "box2", "host": "http://192.168.0.102:11434", "model": LANGUAGE_MODEL, "weight": 2},
+]
+BACKEND_PROBE_INTERVAL = 15  # Seconds between health probes of the LLM_BACKENDS, 0 disables them
+BACKEND_AFFINITY_SLACK = 1  # A session stays on its last backend (cached prompt) unless it is this much busier
+OLLAMA_KEEP_ALIVE = "30m"  # How long Ollama keeps the model loaded after a request, -1 keeps it forever
+WARMUP_ON_START = True  # Load LANGUAGE_MODEL when the server starts instead of on the first message
+HEARTBEAT_INTERVAL = 240  # Seconds between keep-alive requests during ACTIVE_HOURS, 0 disables them
+ACTIVE_HOURS = (7, 23)  # Local hours [start, end) in which the model is kept loaded
+COLD_LOAD_SECONDS = 1.0  # A request whose model load took longer than this is logged as cold
+SEND_TIMINGS = True  # Add per-stage "timings" (ms) to the final events of a reply
 EMOTION = "happy"  # Options: neutral, happy, sad, angry, surprised, disgusted, fearful, etc...
 SYSTEM_PROMPT = f""" You are a expressive handheld AI assistant named ZELNA that always answers with a {EMOTION} tone. """
 TTS_VOICE_ID = 2 # Change this to the desired voice ID
+TTS_RATE = 180  # Words per minute of the pyttsx3 voice
+STREAM_RESPONSES = True  # Send partial text to the client as "response_chunk" events while generating
+SENTENCE_PIPELINE = True  # Synthesize and send audio sentence by sentence while the reply is still being generated
+AUDIO_FORMAT = "mp3"  # "mp3": encoded in-process by lameenc at MP3_BITRATE, "pcm": raw 16-bit frames, about 353 kbit/s (44 KB per second of speech at 22 kHz)
+MP3_BITRATE = "32k"  # Speech stays clear at 32 kbit/s, 4 KB per second of speech instead of 44 KB for pcm
+BINARY_AUDIO = True  # Send audio as binary "audio_chunk" events instead of base64 inside JSON
+AUDIO_CHUNK_BYTES = 16 * 1024  # Upper bound for the audio carried by one "audio_chunk" event
+MIN_SENTENCE_LENGTH = 20  # Shorter sentences are merged with the next one to avoid tiny audio segments
+MAX_QUEUED_REQUESTS = 8  # Messages waiting for an LLM worker, clients get a "busy" event beyond this
+LLM_WORKERS = 2  # Replies generated concurrently
+CONTEXT_TOKEN_BUDGET = 2048  # Upper bound for the prompt; older turns are folded into a running summary
+SUMMARIZE_OLD_TURNS = True  # Summarize turns that no longer fit in CONTEXT_TOKEN_BUDGET; with OLLAMA_NUM_PARALLEL=1 each summary evicts the cached conversation
+STABLE_PROMPT_PREFIX = True  # Keep the prompt prefix identical between turns so Ollama reuses its prompt cache
+MAX_STORED_MESSAGES = 100  # History kept per session and sent to the client
+SUMMARY_PROMPT = """Condense the conversation below into a short summary of the facts, names and requests a helpful assistant should remember. Merge it with the current summary. Answer with the summary only."""
+TTS_WORKERS = 2  # Sentences synthesized concurrently, each by its own TTS process
+TTS_TIMEOUT = 60  # Seconds before a TTS process that does not answer is restarted
+AUDIO_CACHE_MEMORY_BYTES = 8 * 1024 * 1024  # In-memory tier of the synthesized speech cache
+AUDIO_CACHE_DISK_BYTES = 128 * 1024 * 1024  # On-disk tier, under AUDIO_CACHE_DIR
+AUDIO_CACHE_MAX_TEXT_LENGTH = 120  # Only short, likely repeated utterances are cached
+SERVER_STT = False  # Recognize microphones streamed by clients with SERVER_STT; loads STT_MODEL_NAME (about 1.8 GB download, several GB of RAM)
+STT_MODEL_NAME = "vosk-model-en-us-0.22"  # Larger model used for clients that stream their microphone (SERVER_STT)
+STT_WORKERS = 2  # Microphone streams recognized at the same time
+LOCAL_INTENTS = True  # Answer simple commands (time, volume, repeat, ...) without the LLM, see intents.py
+CLIENT_COMMANDS = ["shutdown"]  # Transcripts the client handles itself, not answered by the server
 
-WAV_PATH = "temp/output.wav"
-MP3_PATH = "temp/output.mp3"
-CHAT_HISTORY_PATH = "temp/chat_history.json"
+CHAT_HISTORY_PATH = "temp/chat_history.json"  # history from before sessions, adopted by the first session
+SESSIONS_DIR = "temp/sessions"
+AUDIO_CACHE_DIR = "temp/tts_cache"
 
-# Initialize pyttsx3 voice engine
-engine = pyttsx3.init()
-engine.setProperty("rate", 180)
-engine.setProperty("volume", 1.0)
-voices = engine.getProperty("voices")
-engine.setProperty("voice", voices[TTS_VOICE_ID].id)
+# Fixed server messages, synthesized into the audio cache at startup
+RESPONSE_FAILED_MESSAGE = "Response could not be generated :("
+PREWARM_TEXTS = [RESPONSE_FAILED_MESSAGE, "Failed to generate TTS", "Failed to process message", *INTENT_REPLIES]
+
+# Requests go to the healthy backend with the fewest requests in flight per weight
+llmBackends = BackendRegistry.from_config(LLM_BACKENDS, LANGUAGE_MODEL, BACKEND_PROBE_INTERVAL, BACKEND_AFFINITY_SLACK)
+
+# Long-lived TTS processes, each with its own pyttsx3 engine, started by create_app
+ttsPool = TTSWorkerPool(TTS_WORKERS, TTS_VOICE_ID, TTS_RATE, tempDir="temp", timeout=TTS_TIMEOUT, mp3Bitrate=MP3_BITRATE)
 
 os.makedirs("temp", exist_ok=True) # Ensure temp directory exists
 
+audioCache = AudioCache(AUDIO_CACHE_DIR, AUDIO_CACHE_MEMORY_BYTES, AUDIO_CACHE_DISK_BYTES)
+AUDIO_CACHE_FORMAT = f"mp3-{MP3_BITRATE}" if AUDIO_FORMAT == "mp3" else AUDIO_FORMAT  # cached audio of another bitrate is not reused
+
+# Recognizers for server-side speech recognition, the model is loaded by start_services if SERVER_STT is on
+recognizerPool = RecognizerPool(STT_MODEL_NAME, STT_WORKERS, enabled=SERVER_STT)
+
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+|\n+")
 
-def create_app():
-    """Create and configure Flask app with SocketIO."""
+
+def create_app(warmup=WARMUP_ON_START):
+    """Create and configure Flask app with SocketIO.
+
+    With warmup the language model is loaded in the background right away and, if HEARTBEAT_INTERVAL
+    is set, kept loaded during ACTIVE_HOURS.
+    """
     app = Flask(__name__)
     app.config["SECRET_KEY"] = "secret!"
     socketio.init_app(app, cors_allowed_origins="*")
+    app.add_url_rule("/metrics", "metrics", metricsRoute)
+    start_services(warmup)
     return app
 
 
+def start_services(warmup=WARMUP_ON_START, llmWorkers=True):
+    """Start the worker pools and background threads both servers share.
+
+    Without llmWorkers only the TTS workers of the scheduler are started, zelnaAsyncServer.py
+    generates its replies on the event loop.
+    """
+    register_metric_gauges()
+    ttsPool.start()
+    scheduler.start(llmWorkers)
+    llmBackends.start()
+    threading.Thread(target=prewarm_audio_cache, daemon=True).start()
+    if SERVER_STT:
+        threading.Thread(target=recognizerPool.load, daemon=True).start()
+    if warmup:
+        threading.Thread(target=warm_up_model, daemon=True).start()
+        if HEARTBEAT_INTERVAL:
+            threading.Thread(target=model_heartbeat, daemon=True).start()
+
+
+def metricsRoute():
+    """Prometheus text format: stage latency summaries, counters and queue gauges."""
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
+def register_metric_gauges():
+    metrics.gauge("queue_depth", scheduler.depth, "Messages waiting for an LLM worker.")
+    metrics.gauge("active_requests", lambda: scheduler.stats()["active"], "Messages being answered.")
+    metrics.gauge("tts_queue_depth", lambda: scheduler.stats()["ttsQueued"], "Sentences waiting for a TTS worker.")
+    metrics.gauge("sessions", lambda: len(sessions), "Sessions loaded since start.")
+    metrics.gauge("speech_streams", lambda: len(speechStreams), "Microphone streams being recognized.")
+    metrics.gauge("tts_worker_restarts_total", lambda: ttsPool.restarts, "TTS processes restarted.", kind="counter")
+    metrics.gauge("audio_cache_hits_total", lambda: audioCache.stats()["hits"], "Audio cache memory hits.", kind="counter")
+    metrics.gauge("audio_cache_disk_hits_total", lambda: audioCache.stats()["diskHits"], "Audio cache disk hits.", kind="counter")
+    metrics.gauge("intent_hit_ratio", lambda: intentRouter.stats()["hitRate"], "Share of messages answered without the LLM.")
+    metrics.gauge("audio_cache_misses_total", lambda: audioCache.stats()["misses"], "Audio cache misses.", kind="counter")
+    metrics.gauge("backend_healthy", lambda: backend_stat("healthy"), "1 if the LLM backend passed its last probe.", label="backend")
+    metrics.gauge("backend_in_flight", lambda: backend_stat("inFlight"), "LLM requests in flight.", label="backend")
+    metrics.gauge("backend_requests_total", lambda: backend_stat("requests"), "LLM requests.", kind="counter", label="backend")
+    metrics.gauge("backend_failures_total", lambda: backend_stat("failures"), "Failed LLM requests.", kind="counter", label="backend")
+    metrics.gauge("backend_latency_p50_seconds", lambda: backend_stat("latencyP50"), "Median LLM request time.", label="backend")
+    metrics.gauge("backend_latency_p95_seconds", lambda: backend_stat("latencyP95"), "95th percentile LLM request time.", label="backend")
+
+
+def backend_stat(key):
+    return {name: stats[key] for name, stats in llmBackends.stats().items()}
+
+
+def warm_up_model():
+    """Load the language model on every backend with an empty request and pin it with OLLAMA_KEEP_ALIVE."""
+    for backend in llmBackends.backends:
+        started = time.perf_counter()
+        try:
+            # An empty prompt only loads the model, nothing is generated
+            response = backend.client.generate(model=backend.model, prompt="", keep_alive=OLLAMA_KEEP_ALIVE)
+            loadSeconds = (response.get("load_duration") or 0) / 1e9
+            print(f"Model {backend.model} on {backend.name} ready after {time.perf_counter() - started:.2f}s ({loadSeconds:.2f}s load)")
+        except Exception as e:
+            print(f"Error while warming up {backend.model} on {backend.name}: {e}")
+
+
+def in_active_hours(hour=None):
+    start, end = ACTIVE_HOURS
+    hour = time.localtime().tm_hour if hour is None else hour
+    return start <= hour < end if start <= end else hour >= start or hour < end
+
+
+def model_heartbeat():
+    """Keep the model loaded during ACTIVE_HOURS; outside them Ollama unloads it after OLLAMA_KEEP_ALIVE."""
+    while True:
+        time.sleep(HEARTBEAT_INTERVAL)
+        if in_active_hours():
+            warm_up_model()
+
+
+def log_llm_latency(response, started, firstTokenAt=None):
+    """Log whether a request had to load the model and how long it took."""
+    loadSeconds = (response.get("load_duration") or 0) / 1e9
+    state = "cold" if loadSeconds > COLD_LOAD_SECONDS else "warm"
+    firstToken = f", first token after {firstTokenAt - started:.2f}s" if firstTokenAt else ""
+    print(f"LLM request {state}: {time.perf_counter() - started:.2f}s total, {loadSeconds:.2f}s model load{firstToken}")
+
+
+def call_llm(function, prefer=None):
+    """Run function(backend) on the least loaded backend, on the next one if it raises.
+
+    Returns (result, backend); raises the last error once every backend has failed.
+    """
+    tried = set()
+    lastError = RuntimeError("No LLM backend configured")
+    while True:
+        backend = llmBackends.choose(exclude=tried, prefer=prefer)
+        if backend is None:
+            raise lastError
+        tried.add(backend.name)
+        try:
+            with backend.request():
+                return function(backend), backend
+        except Exception as e:
+            lastError = e
+            print(f"LLM backend {backend.name} failed ({e}), trying another one")
+
+
 def clean_text(text):
     """Remove markdown-like formatting symbols from the text."""
     return re.sub(r"[\*_/`~|<>]", "", text)
 
-def chatWithHistory(input, systemPrompt="You are a helpful chat assistant."):
-    """Handle chat input while maintaining message history."""
-    global messages
-    maxHistory = 20
+def chatWithHistory(session, input, systemPrompt="You are a helpful chat assistant.", onChunk=None, cancelled=None):
+    """Handle chat input while maintaining the message history of the session.
 
-    # Trim message history to maintain a manageable size
-    if len(messages) > maxHistory * 2:
-        messages = messages[-(maxHistory * 2):]
+    The prompt is built by the session's context window, which keeps it under CONTEXT_TOKEN_BUDGET.
+    If onChunk is given the reply is streamed and onChunk is called with every cleaned piece of text.
+    Setting the cancelled event stops a streamed reply; what was generated until then is kept.
+    """
+    temp_messages = session.begin_reply(input, systemPrompt)
+    reply = None
+    try:
+        started = time.perf_counter()
+        if onChunk is None:
+            def generate(backend):
+                return backend.client.chat(
+                    model=backend.model, messages=temp_messages, options={"temperature": 0.8}, keep_alive=OLLAMA_KEEP_ALIVE
+                )
 
-    # Add the user's input to persistent history
-    messages.append({"role": "user", "content": input})
+            response, backend = call_llm(generate, prefer=session.backendName)
+            rawContent = response["message"]["content"]
+            responseContent = clean_text(rawContent)
+            log_llm_latency(response, started)
+        else:
+            def generate(backend):
+                # Failing before the first chunk tries the next backend, after it the partial reply is kept
+                if cancelled is not None and cancelled.is_set():
+                    return "", ""
+                parts = []
+                rawParts = []
+                firstTokenAt = None
+                stream = backend.client.chat(
+                    model=backend.model, messages=temp_messages, options={"temperature": 0.8}, keep_alive=OLLAMA_KEEP_ALIVE, stream=True
+                )
+                try:
+                    for part in stream:
+                        if cancelled is not None and cancelled.is_set():
+                            stream.close()  # closes the HTTP response, so Ollama stops generating
+                            print("Generation cancelled")
+                            break
+                        rawParts.append(part["message"]["content"])
+                        chunk = clean_text(part["message"]["content"])
+                        if chunk:
+                            firstTokenAt = firstTokenAt or time.perf_counter()
+                            parts.append(chunk)
+                            onChunk(chunk)
+                        if part.get("done"):
+                            log_llm_latency(part, started, firstTokenAt)
+                except Exception as e:
+                    if not parts:
+                        raise
+                    print(f"LLM backend {backend.name} failed during the reply ({e}), keeping what was generated")
+                    backend.mark_failed(e)
+                return "".join(rawParts), "".join(parts)
 
-    # Create a temporary message set with the system prompt at the top
-    temp_messages = [{"role": "system", "content": systemPrompt}] + messages
+            (rawContent, responseContent), backend = call_llm(generate, prefer=session.backendName)
+        session.backendName = backend.name
 
-    try:
-        response = ollama.chat(model=LANGUAGE_MODEL, messages=temp_messages, options={"temperature": 0.8})
-        responseContent = clean_text(response["message"]["content"])
-        messages.append({"role": "assistant", "content": responseContent})
+        # Keep the unmodified reply for the prompt so the next turn matches Ollama's cached prefix
+        if responseContent:
+            reply = {"role": "assistant", "content": responseContent}
+            if rawContent != responseContent:
+                reply["raw"] = rawContent
         return responseContent
 
     except Exception as e:
         print(f"Error while running ollama chat: {e}")
-        return "Response could not be generated :("
+        return RESPONSE_FAILED_MESSAGE
+
+    finally:
+        session.end_reply(reply)
+
+
+def summarize_messages(previousSummary, messages):
+    """Condense turns that fell out of the context window into the running summary."""
+    transcript = "\n".join(f"{m.get('role')}: {m.get('content')}" for m in messages)
+    prompt = [
+        {"role": "system", "content": SUMMARY_PROMPT},
+        {"role": "user", "content": f"Current summary: {previousSummary or '(none)'}\n\nConversation:\n{transcript}"},
+    ]
+    response, backend = call_llm(
+        lambda backend: backend.client.chat(
+            model=backend.model, messages=prompt, options={"temperature": 0.2, "num_predict": 200}, keep_alive=OLLAMA_KEEP_ALIVE
+        )
+    )
+    return clean_text(response["message"]["content"]).strip()
+
+
+class Session:
+    """Chat history, files and Socket.IO room of one handheld."""
+
+    def __init__(self, key):
+        self.key = key
+        self.room = f"session:{key}"
+        self.dir = os.path.join(SESSIONS_DIR, key)
+        self.lock = threading.Lock()  # one LLM reply at a time per handheld
+        self.historyLock = threading.RLock()  # messages and journal, held only while they change
+        self.replying = False  # between the user message of an LLM reply and the reply itself
+        self.deferred = []  # intent exchanges stored once that reply has been
+        self.backendName = None  # LLM backend of the last reply, which has this session's prompt cached
+        self.replyScheduler = scheduler  # queue of the LLM replies, zelnaAsyncServer.py has its own
+
+        os.makedirs(self.dir, exist_ok=True)
+        journalPath = os.path.join(self.dir, "chat_history.jsonl")
+        legacyPath = os.path.join(self.dir, "chat_history.json")  # written before the journal existed
+        if not os.path.exists(journalPath) and not os.path.exists(legacyPath) and os.path.exists(CHAT_HISTORY_PATH):
+            shutil.move(CHAT_HISTORY_PATH, legacyPath)
+            print(f"Adopted {CHAT_HISTORY_PATH} as history of session {key}")
+
+        self.context = ContextWindow(
+            CONTEXT_TOKEN_BUDGET,
+            summarize_messages if SUMMARIZE_OLD_TURNS else None,
+            stablePrefix=STABLE_PROMPT_PREFIX,
+        )
+        self.journal = ChatJournal(journalPath, legacyPath=legacyPath)
+        self.messages = self.journal.load()
+
+        # Message ids are never reused; clearedAfter is the last id before the latest clear
+        lastClear = self.journal.lastClear or {}
+        self.clearedAfter = lastClear.get("lastId", 0)
+        self.lastId = max([self.clearedAfter] + [m.get("id", 0) for m in self.messages])
+        if any("id" not in m for m in self.messages):
+            for m in self.messages:
+                if "id" not in m:
+                    self.lastId += 1
+                    m["id"] = self.lastId
+            self.journal.compact(self.messages)  # persist the ids given to older messages
+
+    def emit(self, event, data):
+        """Send an event to the handhelds of this session only."""
+        socketio.emit(event, data, to=self.room)
+
+    def add_message(self, message):
+        with self.historyLock:
+            self.lastId += 1
+            message["id"] = self.lastId
+            self.messages.append(message)
+            self.journal.append(message)
+
+    def clear(self):
+        with self.historyLock:
+            self.messages = []
+            self.deferred = []
+            self.context.reset()
+            self.clearedAfter = self.lastId
+            self.journal.clear(lastId=self.lastId)
+
+    def begin_reply(self, text, systemPrompt):
+        """Store the user's message of an LLM reply and return the prompt for it."""
+        with self.historyLock:
+            # Trim message history to maintain a manageable size
+            if len(self.messages) > MAX_STORED_MESSAGES:
+                self.context.forget(self.messages[:-MAX_STORED_MESSAGES])
+                self.messages = self.messages[-MAX_STORED_MESSAGES:]
+
+            self.add_message({"role": "user", "content": text})
+            self.replying = True
+
+            # System prompt, summary of older turns and the newest turns that fit the budget
+            return self.context.build(systemPrompt, self.messages)
+
+    def end_reply(self, message=None):
+        """Store the reply, then the intent exchanges that were answered while it was generated."""
+        with self.historyLock:
+            if message is not None:
+                self.add_message(message)
+            self.replying = False
+            deferred, self.deferred = self.deferred, []
+            for m in deferred:
+                self.add_message(m)
+
+    def add_exchange(self, text, answer):
+        """Store a question and its answer; during an LLM reply only after it, so every turn stays paired."""
+        exchange = [{"role": "user", "content": text}, {"role": "assistant", "content": answer}]
+        with self.historyLock:
+            if self.replying:
+                self.deferred += exchange
+                return None
+            for m in exchange:
+                self.add_message(m)
+            return self.lastId
+
+    def compact_journal(self):
+        with self.historyLock:
+            self.journal.maybe_compact(self.messages)
+
+    def messages_since(self, lastId):
+        """Return the messages after lastId, or None if the client has to reload the whole history."""
+        if not isinstance(lastId, int) or lastId <= self.clearedAfter or lastId > self.lastId:
+            return None
+
+        delta = []
+        for m in reversed(self.messages):
+            if m.get("id", 0) <= lastId:
+                break
+            delta.append(m)
+        delta.reverse()
+        return delta
+
+
+def session_key_from_auth(auth):
+    """Key a session by the device id the client sends (its board serial or a stored uuid), or by its auth token."""
+    auth = auth if isinstance(auth, dict) else {}
+    device = str(auth.get("device") or "")
+    if device:
+        return re.sub(r"[^A-Za-z0-9_-]", "_", device)[:64]
+    token = str(auth.get("token") or "")
+    return "token-" + hashlib.sha256(token.encode("utf-8")).hexdigest()[:16]
+
+
+def get_session(auth, factory=None):
+    """Return the session for the connecting client, creating it with factory(key) on first use."""
+    key = session_key_from_auth(auth)
+    with sessionsLock:
+        if key not in sessions:
+            sessions[key] = (factory or Session)(key)
+        return sessions[key]
+
+class ReplyRequest:
+    """One message of a session being answered; the client can cancel it by its request id."""
+
+    def __init__(self, session, text, requestId=None):
+        self.session = session
+        self.text = text
+        self.requestId = requestId or uuid.uuid4().hex
+        self.cancelled = threading.Event()
+        self.created = time.perf_counter()
+        self.timings = {}  # stage -> seconds, summed over the sentences of the reply
+        self.pipeline = None  # SpeechPipeline sending the audio, it finishes the reply after the last segment
+        self.lock = threading.Lock()
+
+    def emit(self, event, data):
+        """Send an event about this reply to the session, tagged with the request id."""
+        self.session.emit(event, {**data, "requestId": self.requestId})
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def is_cancelled(self):
+        return self.cancelled.is_set()
+
+    @contextmanager
+    def span(self, stage):
+        """Time a stage of this reply."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - started)
+
+    def record(self, stage, seconds):
+        with self.lock:
+            self.timings[stage] = self.timings.get(stage, 0) + seconds
+        metrics.observe(stage, seconds)
+
+    def add_timings(self, timings):
+        for stage, seconds in timings.items():
+            self.record(stage, seconds)
+
+    def timings_ms(self):
+        with self.lock:
+            return {stage: round(seconds * 1000, 1) for stage, seconds in self.timings.items()}
+
+
+class SentenceSplitter:
+    """Split streamed text into sentences as soon as they are complete."""
+
+    def __init__(self, minLength=MIN_SENTENCE_LENGTH):
+        self.minLength = minLength
+        self.buffer = ""
+
+    def feed(self, text):
+        """Add a chunk of text and return the sentences completed by it."""
+        self.buffer += text
+        pieces = SENTENCE_END.split(self.buffer)
+        self.buffer = pieces.pop()  # the last piece may still be growing
+
+        sentences = []
+        pending = ""
+        for piece in pieces:
+            pending = f"{pending} {piece.strip()}".strip()
+            if len(pending) >= self.minLength:
+                sentences.append(pending)
+                pending = ""
+
+        if pending:
+            self.buffer = f"{pending} {self.buffer}"
+        return sentences
+
+    def flush(self):
+        """Return whatever text is left once generation has finished."""
+        rest = self.buffer.strip()
+        self.buffer = ""
+        return rest
+
+
+def split_sentences(text):
+    """Split a complete text the way a streamed reply is split."""
+    splitter = SentenceSplitter()
+    sentences = splitter.feed(text)
+    rest = splitter.flush()
+    return sentences + [rest] if rest else sentences
+
+
+class AudioStream:
+    """Send the audio of one reply to the client, either as binary chunks or as base64 segments.
+
+    Binary chunks carry a sequence number that runs across the whole reply and the last event has
+    "final" set, so the client can start playing before the last byte has arrived.
+    """
+
+    def __init__(self, reply):
+        self.reply = reply
+        self.seq = 0
+        self.index = 0
+
+    def send(self, audio, audioFormat):
+        """Send one synthesized segment."""
+        if self.index == 0:
+            self.reply.record("first_audio", time.perf_counter() - self.reply.created)
+
+        if BINARY_AUDIO:
+            with self.reply.span("emit"):
+                for start in range(0, len(audio), AUDIO_CHUNK_BYTES):
+                    self.reply.emit(
+                        "audio_chunk",
+                        {"seq": self.seq, "data": audio[start : start + AUDIO_CHUNK_BYTES], "final": False, **audioFormat},
+                    )
+                    self.seq += 1
+        else:
+            with self.reply.span("base64"):
+                encoded = base64.b64encode(audio).decode("utf-8")
+            with self.reply.span("emit"):
+                self.reply.emit(
+                    "response_audio",
+                    {"audio_file": encoded, "index": self.index, "final": False, **audioFormat},
+                )
+        self.index += 1
+
+    def close(self):
+        """Tell the client that no more audio follows for this reply."""
+        self.reply.record("total", time.perf_counter() - self.reply.created)
+        final = {"timings": self.reply.timings_ms()} if SEND_TIMINGS else {}
+        if BINARY_AUDIO:
+            self.reply.emit("audio_chunk", {"seq": self.seq, "final": True, **final})
+        else:
+            self.reply.emit("response_audio", {"index": self.index, "final": True, **final})
+
+
+class SpeechPipeline:
+    """Synthesize sentences on the TTS workers and emit each audio segment, in order, as soon as it is ready.
+
+    Once the reply is cancelled, queued sentences are dropped without running TTS.
+    """
+
+    def __init__(self, reply):
+        self.reply = reply
+        reply.pipeline = self
+        self.audioStream = AudioStream(reply)
+        self.results = {}  # sentence index -> speech, waiting for earlier sentences
+        self.nextIndex = 0
+        self.count = 0
+        self.closed = False
+        self.lock = threading.Lock()
+
+    def put(self, sentence):
+        index = self.count
+        self.count += 1
+        future = scheduler.submit_tts(self._synthesize, sentence)
+        future.add_done_callback(lambda f: self._done(index, sentence, f))
+
+    def close(self):
+        """Mark the end of the reply; the client is told once the last segment has been sent."""
+        with self.lock:
+            self.closed = True
+            self._flush()
+
+    def _synthesize(self, sentence):
+        if self.reply.is_cancelled():
+            return None
+        timings = {}
+        with self.reply.span("tts"):
+            speech = synthesize_speech(sentence, timings)
+        self.reply.add_timings(timings)
+        return speech
+
+    def _done(self, index, sentence, future):
+        speech = None if future.exception() else future.result()
+        if speech is None and not self.reply.is_cancelled():
+            print(f"Failed to generate TTS for: {sentence}")
+        with self.lock:
+            self.results[index] = speech
+            self._flush()
+
+    def _flush(self):
+        """Send every segment whose predecessors have been sent, must be called with the lock held."""
+        while self.nextIndex in self.results:
+            speech = self.results.pop(self.nextIndex)
+            self.nextIndex += 1
+            if speech is not None and not self.reply.is_cancelled():
+                self.audioStream.send(*speech)
+
+        if self.closed and self.nextIndex == self.count:
+            self.closed = False  # only close once
+            self.audioStream.close()
+            finish_reply(self.reply)  # until now the client could still cancel the queued sentences
+            print(f"{self.audioStream.index} audio segments sent")
+
+
+class Scheduler:
+    """Bounded request queue with worker pools for LLM inference and TTS, off the Socket.IO handlers."""
+
+    def __init__(self, llmWorkers=LLM_WORKERS, ttsWorkers=TTS_WORKERS, maxQueued=MAX_QUEUED_REQUESTS):
+        self.llmWorkers = llmWorkers
+        self.ttsWorkers = ttsWorkers
+        self.requests = queue.Queue(maxsize=maxQueued)
+        self.ttsJobs = queue.Queue()  # bounded by the requests producing them
+        self.activeRequests = 0
+        self.lock = threading.Lock()
+        self.started = False
+
+    def start(self, llmWorkers=True):
+        with self.lock:
+            if self.started:
+                return
+            self.started = True
+
+        for i in range(self.llmWorkers if llmWorkers else 0):
+            threading.Thread(target=self._llmWorker, name=f"llm-worker-{i}", daemon=True).start()
+        for i in range(self.ttsWorkers):
+            threading.Thread(target=self._ttsWorker, name=f"tts-worker-{i}", daemon=True).start()
+
+    def submit(self, reply):
+        """Queue a reply request, returns its position in the queue or None when the queue is full."""
+        try:
+            self.requests.put_nowait(reply)
+        except queue.Full:
+            return None
+        return self.requests.qsize()
+
+    def submit_tts(self, function, *args):
+        """Run function(*args) on a TTS worker, returns a Future with its result."""
+        future = Future()
+        self.ttsJobs.put((future, function, args))
+        return future
+
+    def depth(self):
+        return self.requests.qsize()
+
+    def saturated(self):
+        """True when every LLM worker is busy, so new messages have to wait."""
+        with self.lock:
+            return self.activeRequests >= self.llmWorkers
+
+    def stats(self):
+        with self.lock:
+            active = self.activeRequests
+        return {"queued": self.requests.qsize(), "active": active, "ttsQueued": self.ttsJobs.qsize()}
+
+    def _llmWorker(self):
+        while True:
+            reply = self.requests.get()
+            reply.record("queue", time.perf_counter() - reply.created)
+            if reply.is_cancelled():
+                metrics.inc("cancelled_total", help="Replies cancelled by the client.")
+                finish_reply(reply)
+                print(f"Request {reply.requestId} cancelled before it started")
+                continue
+
+            with self.lock:
+                self.activeRequests += 1
+            try:
+                with reply.session.lock:
+                    processMessage(reply)
+            except Exception as e:
+                print(f"Error in LLM worker: {e}")
+            finally:
+                if reply.pipeline is None:
+                    finish_reply(reply)
+                with self.lock:
+                    self.activeRequests -= 1
+
+    def _ttsWorker(self):
+        while True:
+            future, function, args = self.ttsJobs.get()
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(function(*args))
+            except Exception as e:
+                future.set_exception(e)
+
+
+scheduler = Scheduler()
+
 
 def parseOllamaMessageArrayToJson(messages):
     """Convert message history into JSON format for the client."""
@@ -68,132 +711,410 @@ def parseOllamaMessageArrayToJson(messages):
         {
             "sender": "server" if m.get("role") == "assistant" else "client",
             "message": m.get("content"),
+            "id": m.get("id"),
         }
         for m in messages
     ]
 
 
-def save_messages_to_file(messages, filename=CHAT_HISTORY_PATH):
-    """Save message history to a file."""
-    with open(filename, "w") as file:
-        json.dump(messages, file, indent=2)
-    print(f"Messages saved to {filename}")
+def synthesize_speech(text, timings=None):
+    """Synthesize text on the TTS process pool, returns (audio bytes, format info) or None.
 
+    Short utterances are looked up in and added to the audio cache. Worker stage timings are added
+    to the timings dict if one is given.
+    """
+    if len(text) > AUDIO_CACHE_MAX_TEXT_LENGTH:
+        return ttsPool.synthesize(text, AUDIO_FORMAT, timings)
 
-def load_messages_from_file(filename=CHAT_HISTORY_PATH):
-    """Load message history from a file."""
-    try:
-        # Check if file exists and is not empty
-        if not os.path.exists(filename) or os.path.getsize(filename) == 0:
-            with open(filename, "w") as file:
-                file.write("[]")
-            return []
-        
-        with open(filename, "r") as file:
-            fileMessages = json.load(file)
-        print(f"Messages loaded from {filename}")
-        return fileMessages
-        
-    except (FileNotFoundError, json.JSONDecodeError):
-        # Handle both missing file and invalid JSON cases
-        print(f"Invalid or missing file at {filename}. Starting fresh.")
-        with open(filename, "w") as file:
-            file.write("[]")
-        return []
-
-
-def TTS_Pyttsx3(text: str, wav_path: str = WAV_PATH, mp3_path: str = MP3_PATH):
-    """Text to speech function using pyttsx3 engine and saving as a .wav file, then convert to .mp3."""
-    try:
-        # Save as wav first
-        engine.save_to_file(text, wav_path)
-        engine.runAndWait()
-        engine.stop()
-
-        # Convert wav to mp3 using ffmpeg
-        subprocess.run(["ffmpeg", "-y", "-i", wav_path, mp3_path], check=True)
-        return True
-    except Exception as e:
-        print(f"Error while running TTS or converting to MP3: {e}")
+    key = AudioCache.make_key(text, TTS_VOICE_ID, TTS_RATE, AUDIO_CACHE_FORMAT)
+    cached = audioCache.get(key)
+    if cached is not None:
+        return cached
+
+    speech = ttsPool.synthesize(text, AUDIO_FORMAT, timings)
+    if speech is not None:
+        audioCache.put(key, *speech)
+    return speech
+
+
+def prewarm_audio_cache():
+    """Synthesize the fixed server messages so they never wait for the TTS engine."""
+    for text in PREWARM_TEXTS:
+        synthesize_speech(text)
+    print(f"Audio cache warmed up: {audioCache.stats()}")
+
+
+# Transport-independent handling of the client events, shared with zelnaAsyncServer.py. emit is an
+# emit(event, data) function that sends to the one client the event came from; events about a reply
+# go to the whole session through Session.emit.
+
+def client_emitter(sid):
+    """emit(event, data) for one client of this server."""
+    return lambda event, data: socketio.emit(event, data, to=sid)
+
+
+def connect_client(session, sid, auth, emit):
+    """Register the client and send it the chat history, or only what it missed."""
+    with sessionsLock:
+        sessionsBySid[sid] = session
+    print(f"Client connected to session {session.key}!", str(auth))
+
+    # A reconnecting client sends the id of the last message it has and only gets the rest
+    lastId = auth.get("lastMessageId") if isinstance(auth, dict) else None
+    delta = session.messages_since(lastId)
+    if delta is None:
+        emit("initialize", parseOllamaMessageArrayToJson(session.messages))
+        print("Chat history sent to client")
+    else:
+        emit("sync", parseOllamaMessageArrayToJson(delta))
+        print(f"{len(delta)} new messages sent to client")
+
+
+def disconnect_client(sid):
+    """Forget the client, stop recognizing its microphone streams and compact the journal."""
+    with sessionsLock:
+        session = sessionsBySid.pop(sid, None)
+    with speechStreamsLock:
+        orphaned = [streamId for streamId, entry in speechStreams.items() if entry["sid"] == sid]
+        for streamId in orphaned:
+            speechStreams.pop(streamId)["stream"].abort()
+    if session is not None:
+        print(f"Client of session {session.key} disconnected.")
+        session.compact_journal()
+
+
+def reply_request(session, message):
+    """The message is either the text itself or {"text": ..., "requestId": ...}."""
+    if isinstance(message, dict):
+        return ReplyRequest(session, str(message.get("text", "")), message.get("requestId"))
+    return ReplyRequest(session, str(message))
+
+
+def queue_reply(reply, emit):
+    """Hand a message to the scheduler, telling the client if it has to wait or the queue is full."""
+    session = reply.session
+    replies = session.replyScheduler
+    metrics.inc("requests_total", help="Messages received from clients.")
+
+    # Cancellable until its last audio segment has been sent
+    with pendingRepliesLock:
+        pendingReplies[reply.requestId] = reply
+
+    if LOCAL_INTENTS and answer_with_intent(reply):
+        return
+
+    # Inference runs on the scheduler workers so this handler returns right away
+    saturated = replies.saturated()
+    position = replies.submit(reply)
+    if position is None:
+        finish_reply(reply)
+        metrics.inc("busy_total", help="Messages rejected because the queue was full.")
+        depth = replies.depth()
+        emit(
+            "busy",
+            {"message": f"Server busy, position {depth + 1}", "position": depth + 1, "depth": depth, "requestId": reply.requestId},
+        )
+        print(f"Queue full ({depth}), message from {session.key} rejected")
+        return
+
+    print(f"Message from {session.key} queued, queue depth: {replies.depth()}")
+    if saturated:
+        emit("queue_status", {"position": position, "depth": replies.depth(), "requestId": reply.requestId})
+
+
+def answer_with_intent(reply):
+    """Answer a simple command right away, returns False if the message has to go to the LLM.
+
+    Does not wait for an LLM reply of the same session, the spoken answer goes through the TTS
+    workers sentence by sentence like any other reply.
+    """
+    matched = intentRouter.match(reply.text)
+    if matched is None:
         return False
 
+    name, found = matched
+    session = reply.session
+    with reply.span("intent"):
+        with session.historyLock:
+            result = intentRouter.answer(name, found, reply)
+            messageId = session.add_exchange(reply.text, result.text) if result.store else session.lastId
+    metrics.inc("intent_hits_total", help="Messages answered by the intent router, by intent.", intent=name)
+    print(f"Message from {session.key} answered by intent {name}: {result.text}")
+
+    if result.action:
+        reply.emit("action", result.action)
+    reply.emit("response", {"message": result.text if result.show else "", "sender": "server", "id": messageId})
+
+    speech = SpeechPipeline(reply)
+    if result.speak:
+        for sentence in split_sentences(result.text):
+            speech.put(sentence)
+    speech.close()
+    return True
+
+
+def cancel_reply(session, data):
+    """Abort generation and TTS of a reply the user is no longer waiting for, returns the reply or None."""
+    requestId = data.get("requestId") if isinstance(data, dict) else data
+    with pendingRepliesLock:
+        reply = pendingReplies.get(requestId)
+
+    if reply is None or reply.session is not session:
+        return None
+    reply.cancel()
+    metrics.inc("cancelled_total", help="Replies cancelled by the client.")
+    print(f"Request {requestId} of session {session.key} cancelled")
+    return reply
+
+
+def start_speech_stream(session, sid, data, emit):
+    """Start recognizing a microphone stream, data is {"streamId", "requestId", "samplerate"}.
+
+    Returns the acknowledgement for the client, {"error": ...} if no recognizer is free. Partial
+    results are sent back as "stt_result" events while the frames arrive.
+    """
+    streamId = data.get("streamId")
+    if session is None or not streamId:
+        return {"error": "Session not found, please reconnect"}
+
+    samplerate = int(data.get("samplerate") or 16000)
+    recognizer = recognizerPool.acquire(samplerate)
+    if recognizer is None:
+        return {"error": recognizerPool.unavailable_reason()}
+
+    def sendPartial(text):
+        emit("stt_result", {"event": "partialResult", "message": text, "streamId": streamId})
+
+    stream = SpeechStream(recognizerPool, recognizer, samplerate, sendPartial)
+    with speechStreamsLock:
+        speechStreams[streamId] = {"stream": stream, "sid": sid, "session": session, "requestId": data.get("requestId"), "emit": emit}
+    metrics.inc("speech_streams_total", help="Microphone streams recognized on the server.")
+    return {"streamId": streamId}
+
+
+def add_speech_frame(data):
+    """One frame of int16 pcm, {"streamId", "seq", "data"}; frames may be handled out of order."""
+    entry = speechStreams.get(data.get("streamId"))
+    if entry is None:
+        return
+    transcript = entry["stream"].add_frame(int(data.get("seq", 0)), data.get("data") or b"")
+    if transcript is not None:
+        finish_speech_stream(data.get("streamId"), transcript)
+
+
+def end_speech_stream(data):
+    """The button was released after {"frames": n} frames were sent."""
+    entry = speechStreams.get(data.get("streamId"))
+    if entry is None:
+        return
+    transcript = entry["stream"].end(int(data.get("frames", 0)))
+    if transcript is not None:
+        finish_speech_stream(data.get("streamId"), transcript)
+
+
+def finish_speech_stream(streamId, transcript):
+    """Send the final transcript to the client and queue the reply to it, without another round trip."""
+    with speechStreamsLock:
+        entry = speechStreams.pop(streamId, None)
+    if entry is None:
+        return
+    metrics.observe("stt_final", time.perf_counter() - entry["stream"].endedAt)
+
+    session = entry["session"]
+    answered = bool(transcript) and transcript.lower().replace(" ", "") not in CLIENT_COMMANDS
+    result = {"event": "finalResult", "message": transcript, "streamId": streamId}
+    if answered:
+        result["requestId"] = entry["requestId"] or uuid.uuid4().hex
+    entry["emit"]("stt_result", result)
+    print(f"Speech of session {session.key} recognized: {transcript}")
+
+    if answered:
+        queue_reply(ReplyRequest(session, transcript, result["requestId"]), entry["emit"])
+
 
 @socketio.on("connect")
 def handleConnection(auth):
     """Handle client connections."""
-    global messages
     try:
-        loaded_messages = load_messages_from_file()
-        # Add only unique messages
-        existing_messages = set(json.dumps(m) for m in messages)
-        new_messages = [
-            m for m in loaded_messages if json.dumps(m) not in existing_messages
-        ]
-        messages.extend(new_messages)
-
-        print("Client connected!", str(auth))
-        socketio.emit("initialize", parseOllamaMessageArrayToJson(messages))
-        print("Chat history sent to client")
-
+        session = get_session(auth)
+        join_room(session.room)
+        connect_client(session, request.sid, auth, client_emitter(request.sid))
     except Exception as e:
         print(f"Error during client connection: {e}")
-        socketio.emit("error", {"message": "Failed to initialize chat history"})
+        socketio.emit("error", {"message": "Failed to initialize chat history"}, to=request.sid)
 
 
 @socketio.on("disconnect")
 def handleDisconnection():
     """Handle client disconnections."""
-    global messages
-    print("Client disconnected. Saving messages.")
-    save_messages_to_file(messages)
+    disconnect_client(request.sid)
 
 
 @socketio.on("message")
 def handleMessage(message):
     """Process incoming messages from the client."""
-    global messages
+    session = sessionsBySid.get(request.sid)
+    if session is None:
+        socketio.emit("response", {"message": "Session not found, please reconnect", "sender": "info"}, to=request.sid)
+        return
+    queue_reply(reply_request(session, message), client_emitter(request.sid))
+
+
+@socketio.on("cancel")
+def handleCancel(data):
+    cancel_reply(sessionsBySid.get(request.sid), data)
+
+
+@socketio.on("stt_start")
+def handleSttStart(data):
+    """The client sends frames only after this acknowledgement, see start_speech_stream."""
+    return start_speech_stream(sessionsBySid.get(request.sid), request.sid, data, client_emitter(request.sid))
+
+
+@socketio.on("stt_audio")
+def handleSttAudio(data):
+    add_speech_frame(data)
+
+
+@socketio.on("stt_end")
+def handleSttEnd(data):
+    end_speech_stream(data)
+
+
+def finish_reply(reply):
+    with pendingRepliesLock:
+        pendingReplies.pop(reply.requestId, None)
+
+
+def processMessage(reply):
+    """Answer one message of a session, streaming text and audio to its room."""
+    session = reply.session
+    message = reply.text
     try:
-        # Support "clearmessages" command
-        if message.lower().replace(" ", "") == "clearmessages":
-            save_messages_to_file([])  # Clear messages
-            messages = []
-            print("Messages cleared")
-            socketio.emit("initialize", [])  # Reset client-side chat history
+        print(f"Message received from {session.key}: {message}")
+
+        if SENTENCE_PIPELINE:
+            processMessagePipelined(reply)
             return
 
-        print(f"Message received: {message}")
+        # Forward partial text to the client while ollama is still generating
+        def onChunk(chunk):
+            if "llm_first_token" not in reply.timings:
+                reply.record("llm_first_token", time.perf_counter() - llmStarted)
+            reply.emit("response_chunk", {"message": chunk, "sender": "server"})
 
         # Process message from ollama and send response
-        response = chatWithHistory(message, systemPrompt=SYSTEM_PROMPT)
-        save_messages_to_file(messages)
-
-        # Convert response to speech and then to MP3
-        if TTS_Pyttsx3(response, WAV_PATH, MP3_PATH):
-            with open(MP3_PATH, "rb") as file:
-                encoded = base64.b64encode(file.read()).decode("utf-8")
-
-            socketio.emit(
-                "response",
-                {"message": response, "sender": "server", "audio_file": encoded},
+        llmStarted = time.perf_counter()
+        with reply.span("llm"):
+            response = chatWithHistory(
+                session, message, systemPrompt=SYSTEM_PROMPT, onChunk=onChunk if STREAM_RESPONSES else None, cancelled=reply.cancelled
             )
-            print(f"Response and audio sent: {response}")
+        if response == RESPONSE_FAILED_MESSAGE:
+            metrics.inc("errors_total", help="Failed LLM requests and message handling errors.", stage="llm")
+        session.compact_journal()
+        if reply_cancelled(reply, response):
+            return
 
-        else:
-            socketio.emit(
-                "response", {"message": "Failed to generate TTS", "sender": "info"}
-            )
-            print("Failed to generate TTS")
+        # Convert response to speech
+        timings = {}
+        with reply.span("tts"):
+            speech = scheduler.submit_tts(synthesize_speech, response, timings).result()
+        reply.add_timings(timings)
+        send_reply(reply, response, speech)
 
     except Exception as e:
         print(f"Error while handling message: {e}")
-        socketio.emit(
+        metrics.inc("errors_total", help="Failed LLM requests and message handling errors.", stage="message")
+        reply.emit(
             "response", {"message": "Failed to process message", "sender": "server"}
         )
 
 
+def processMessagePipelined(reply):
+    """Stream the reply and send speech for every finished sentence while later ones are generated."""
+    session = reply.session
+    speech = SpeechPipeline(reply)
+    splitter = SentenceSplitter()
+
+    def onChunk(chunk):
+        if "llm_first_token" not in reply.timings:
+            reply.record("llm_first_token", time.perf_counter() - llmStarted)
+        if STREAM_RESPONSES:
+            reply.emit("response_chunk", {"message": chunk, "sender": "server"})
+        for sentence in splitter.feed(chunk):
+            speech.put(sentence)
+
+    try:
+        llmStarted = time.perf_counter()
+        with reply.span("llm"):
+            response = chatWithHistory(
+                session, reply.text, systemPrompt=SYSTEM_PROMPT, onChunk=onChunk, cancelled=reply.cancelled
+            )
+        if response == RESPONSE_FAILED_MESSAGE:
+            metrics.inc("errors_total", help="Failed LLM requests and message handling errors.", stage="llm")
+
+        rest = splitter.flush()
+        if rest and not reply.is_cancelled():
+            speech.put(rest)
+        if speech.count == 0 and not reply.is_cancelled():
+            speech.put(response)  # nothing was streamed, e.g. the error message
+    finally:
+        speech.close()
+
+    session.compact_journal()
+    send_streamed_reply(reply, response)
+
+
+def reply_cancelled(reply, response):
+    """Tell the client what was generated until it cancelled the reply, returns False if it did not."""
+    if not reply.is_cancelled():
+        return False
+    reply.emit("response", {"message": response, "sender": "server", "id": reply.session.lastId, "cancelled": True})
+    return True
+
+
+def send_reply(reply, response, speech):
+    """Send a reply with its audio in one piece, speech is (audio bytes, format info) or None."""
+    session = reply.session
+    if speech is not None and BINARY_AUDIO:
+        reply.emit("response", {"message": response, "sender": "server", "id": session.lastId})
+        audioStream = AudioStream(reply)
+        audioStream.send(*speech)
+        audioStream.close()
+        print(f"Response and audio sent: {response}")
+
+    elif speech is not None:
+        audio, audioFormat = speech
+        with reply.span("base64"):
+            encoded = base64.b64encode(audio).decode("utf-8")
+        reply.record("total", time.perf_counter() - reply.created)
+        final = {"timings": reply.timings_ms()} if SEND_TIMINGS else {}
+        reply.emit(
+            "response",
+            {"message": response, "sender": "server", "id": session.lastId, "audio_file": encoded, **audioFormat, **final},
+        )
+        print(f"Response and audio sent: {response}")
+
+    else:
+        reply.emit(
+            "response", {"message": "Failed to generate TTS", "sender": "info"}
+        )
+        print("Failed to generate TTS")
+
+
+def send_streamed_reply(reply, response):
+    """Send the text of a reply whose audio goes out sentence by sentence through a SpeechPipeline."""
+    if reply_cancelled(reply, response):
+        print(f"Request {reply.requestId} stopped after: {response}")
+        return
+
+    reply.emit("response", {"message": response, "sender": "server", "id": reply.session.lastId})
+    print(f"Response sent, audio follows: {response}")
+
+
 if __name__ == "__main__":
     try:
         app = create_app()
-        socketio.run(app, host="0.0.0.0", port=5000, debug=True)
+        socketio.run(app, host="0.0.0.0", port=5000, debug=True, use_reloader=False)  # the reloader would start every worker twice
     except Exception as e:
         print(f"SocketIO server failed to start: {e}")